@@ -129,9 +129,14 @@ socketio_app.py (Main Server)
 ├── CORS enabled for cross-origin requests
 ├── Event handlers for: message, connect, disconnect, clear_session, ping
 ├── Uses Responses API with streaming
-├── Handles stream events directly
+├── Drives the model stream; chat_stream.ChatTurn decides what to emit
 └── Port: 5000
 
+chat_stream.py (Chat Turn Logic)
+├── ChatTurn: stream events -> socket frames, tool calls, follow-up rounds, fallbacks
+├── Shared by socketio_app.py (sync) and asgi_app.py (async)
+└── TokenBatcher, JsonBlockFilter, ToolCallBatch
+
 conversation_manager.py (Session Management)
 ├── Maps session_id to OpenAI conversation_id
 ├── Creates new conversations on demand
@@ -175,6 +180,13 @@ Production:
   → Single worker (required for SocketIO)
   → Production-ready WSGI server
 
+Production (asyncio):
+  uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+  → python-socketio AsyncServer + AsyncOpenAI
+  → Same Socket.IO events and HTTP routes as socketio_app.py
+  → Blocking tools run in a thread pool
+  → Compare with: python benchmark.py streams
+
 Testing:
   python test_client.py
   → Connects via SocketIO
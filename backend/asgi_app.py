@@ -0,0 +1,294 @@
+"""
+ASGI build of socketio_app.py: python-socketio AsyncServer + AsyncOpenAI on a single asyncio loop.
+
+Speaks exactly the SOCKETIO EVENT PROTOCOL documented at the top of socketio_app.py and serves the
+same HTTP routes (/health, frontend files, and /stats and POST /explain when ALLOW_DEBUG_SEARCHES is on).
+Blocking work (tool execution, Dealcar lookups, conversation bookkeeping) runs in the loop's thread pool so it
+never stalls other sessions.
+
+Run with:
+  uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import json
+import mimetypes
+import os
+import uuid
+
+import socketio
+from openai import AsyncOpenAI
+
+from config import settings
+from conversation_manager import conversation_manager
+from tools import AVAILABLE_TOOLS, car_viewer_data, execute_tool, explain_inventory_search, extract_car_id_from_url, fetch_car_by_id, formatted_vehicle, inventory_cache, search_cache, search_cursors
+from instructions import get_system_instructions
+from http_client import http_client
+from tool_projection import tool_output_report
+from inventory_warmup import warmup_stats
+from chat_stream import ChatTurn, TokenBatcher, async_batched_emit, stream_stats, tool_timings
+
+sio = socketio.AsyncServer(
+    async_mode='asgi',
+    cors_allowed_origins='*',
+    engineio_logger=False,
+    logger=False
+)
+
+client = AsyncOpenAI(api_key=settings.openai_api_key)
+
+inventory_cache.load_from_disk()
+inventory_cache.start_background_refresh()
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend')
+CORS_HEADERS = [(b'access-control-allow-origin', b'*'), (b'access-control-allow-headers', b'content-type')]
+
+
+async def offload(fn, *args, **kwargs):
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+def submit_tool(fn):
+    return asyncio.ensure_future(offload(fn))
+
+
+async def _send(send, status: int, body: bytes, content_type: str):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())] + CORS_HEADERS
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _send_json(send, data, status: int = 200):
+    await _send(send, status, json.dumps(data).encode(), 'application/json')
+
+
+async def _read_body(receive) -> bytes:
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+async def http_app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    path, method = scope['path'], scope['method']
+    if method == 'OPTIONS':
+        await _send(send, 204, b'', 'text/plain')
+    elif path == '/health':
+        await _send_json(send, {"status": "healthy", "service": "chatbot-backend"})
+    elif path in ('/stats', '/explain') and not settings.allow_debug_searches:
+        # Cache internals and query plans are debug information, exposed only where debug searches are allowed.
+        await _send(send, 404, b'Not Found', 'text/plain')
+    elif path == '/stats':
+        await _send_json(send, {
+            "inventory_cache": inventory_cache.stats(),
+            "search_cache": search_cache.stats(),
+            "search_cursors": search_cursors.stats(),
+            "tool_outputs": tool_output_report.stats(),
+            "streams": stream_stats.stats(),
+            "tool_calls": tool_timings.stats(),
+            "warmup": warmup_stats.stats(),
+            "http": http_client.stats()
+        })
+    elif path == '/explain' and method == 'POST':
+        try:
+            arguments = json.loads(await _read_body(receive) or b'{}')
+        except json.JSONDecodeError:
+            arguments = {}
+        await _send_json(send, await offload(explain_inventory_search, arguments if isinstance(arguments, dict) else {}))
+    else:
+        file_path = os.path.realpath(os.path.join(FRONTEND_DIR, path.lstrip('/') or 'index.html'))
+        if not file_path.startswith(os.path.realpath(FRONTEND_DIR) + os.sep) or not os.path.isfile(file_path):
+            await _send(send, 404, b'Not Found', 'text/plain')
+            return
+        content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        await _send(send, 200, await offload(_read_file, file_path), content_type)
+
+
+app = socketio.ASGIApp(sio, other_asgi_app=http_app, socketio_path='socket.io')
+
+
+async def send_frames(emit_fn, frames):
+    for event, data in frames:
+        await emit_fn(event, data)
+
+
+async def run_turn(turn, conversation_id, instructions, message, emit_fn):
+    input_items = message
+    while input_items is not None:
+        turn.start_round(input_items)
+        try:
+            stream = await client.responses.create(
+                model=settings.openai_model,
+                conversation={"id": conversation_id},
+                instructions=instructions,
+                input=input_items,
+                tools=AVAILABLE_TOOLS,
+                stream=True
+            )
+            async with stream:
+                async for event in stream:
+                    await send_frames(emit_fn, turn.handle(event))
+                    if turn.stopped:
+                        break
+            # Tool calls started while the stream was still being read; collect them in the order the model issued them.
+            await send_frames(emit_fn, turn.finish_round(await turn.tool_calls.gather_async()))
+        except Exception as e:
+            if not turn.follow_up:
+                raise
+            turn.failed(e)
+            break
+        input_items = turn.next_input()
+    await send_frames(emit_fn, turn.closing())
+
+
+@sio.event
+async def connect(sid, environ, auth=None):
+    await sio.emit('connected', {
+        'session_id': sid,
+        'message': 'Conectado al servidor del chatbot'
+    }, to=sid)
+
+
+@sio.event
+async def disconnect(sid, *args):
+    pass
+
+
+def _detect_car(session_id: str, car_id: str):
+    car_data = fetch_car_by_id(car_id)
+    if car_data and 'error' not in car_data:
+        print(f"[DEBUG] Car data fetched successfully")
+        formatted_car = formatted_vehicle(car_data)
+        conversation_manager.set_car_context(session_id, formatted_car)
+        print(f"[DEBUG] Car context saved: {formatted_car.get('make')} {formatted_car.get('model')}")
+        return formatted_car
+    print(f"[DEBUG] Failed to fetch car data: {car_data}")
+    return None
+
+
+@sio.event
+async def set_page_context(sid, data):
+    try:
+        session_id = data.get('session_id', sid)
+        page_url = data.get('page_url', '')
+
+        print(f"[DEBUG] set_page_context - Session: {session_id}, URL: {page_url}")
+
+        if not page_url or 'renove.es' not in page_url.lower():
+            print(f"[DEBUG] URL not from renove.es, skipping car detection")
+            return
+
+        car_id = extract_car_id_from_url(page_url)
+
+        if car_id:
+            print(f"[DEBUG] Extracted car ID: {car_id}")
+            formatted_car = await offload(_detect_car, session_id, car_id)
+            if formatted_car:
+                await sio.emit('car_detected', {
+                    'session_id': session_id,
+                    'car_name': f"{formatted_car.get('make', '')} {formatted_car.get('model', '')}".strip()
+                }, to=sid)
+                print(f"[DEBUG] Emitted car_detected event")
+        else:
+            print(f"[DEBUG] No car ID found in URL")
+    except Exception as e:
+        print(f"[ERROR] Error in set_page_context: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+@sio.event
+async def message(sid, data):
+    async def emit(event, payload):
+        await sio.emit(event, payload, to=sid)
+
+    session_id = sid
+    # Until the batcher exists (e.g. a payload that is not a dict), errors go out unbatched.
+    emit_chat = emit
+    batcher = None
+    try:
+        print(f"[DEBUG] Received message event: {data}")
+        message = data.get('message')
+        session_id = data.get('session_id', sid)
+        # Traced searches log every vehicle and skip the result cache, so clients only get them when the server allows it.
+        debug = settings.allow_debug_searches and bool(data.get('debug'))
+        batcher = TokenBatcher(session_id, settings.chat_token_window_ms, settings.chat_token_max_chars)
+        emit_chat = async_batched_emit(emit, batcher)
+        turn = ChatTurn(
+            session_id,
+            lambda name, arguments: execute_tool(name, arguments, debug=debug, session_id=session_id),
+            submit_tool, settings.tool_call_concurrency, settings.compact_tool_outputs,
+            car_viewer_data, inventory_cache
+        )
+
+        print(f"[DEBUG] Message: {message}, Session: {session_id}")
+
+        if not message:
+            await emit_chat('error', {'message': 'No se proporcionó mensaje'})
+            return
+
+        await send_frames(emit_chat, turn.processing())
+
+        conversation_id = await offload(conversation_manager.get_or_create_conversation, session_id)
+        print(f"[DEBUG] Using conversation_id: {conversation_id}")
+
+        car_context = conversation_manager.get_car_context(session_id)
+        if car_context:
+            print(f"[DEBUG] Car context found: {car_context.get('make')} {car_context.get('model')}")
+
+        instructions = get_system_instructions(car_context)
+        print(f"[DEBUG] Instructions length: {len(instructions)}")
+
+        await send_frames(emit_chat, turn.text_start())
+
+        print(f"[DEBUG] Starting OpenAI stream...")
+        await run_turn(turn, conversation_id, instructions, message, emit_chat)
+        print(f"[DEBUG] Message processing complete")
+
+    except Exception as e:
+        print(f"[ERROR] Exception in handle_message: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        await emit_chat('error', {
+            'message': f'Error al procesar mensaje: {str(e)}',
+            'session_id': session_id
+        })
+    finally:
+        if batcher is not None:
+            batcher.finish()
+
+
+@sio.event
+async def clear_session(sid, data):
+    session_id = data.get('session_id', sid)
+    success = await offload(conversation_manager.delete_conversation, session_id)
+    await sio.emit('session_cleared', {
+        'session_id': session_id,
+        'success': success
+    }, to=sid)
+
+
+@sio.event
+async def ping(sid, *args):
+    await sio.emit('pong', {'timestamp': str(uuid.uuid4())}, to=sid)
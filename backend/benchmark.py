@@ -0,0 +1,614 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import argparse
+import json
+import logging
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import tools
+from inventory_cache import build_snapshot
+from inventory_columns import CATEGORICAL_COLUMNS, NUMERIC_COLUMNS, NUMERIC_KEYS, InventoryColumns
+from inventory_filter import RANGE_FILTERS, categorical_predicates, filter_rows
+from inventory_index import FilterIndex
+from name_resolution import NameResolver
+from query_planner import plan_rows
+from tool_projection import count_tokens, tool_output
+from chat_stream import JsonBlockFilter, TokenBatcher, ToolCallBatch, batched_emit
+from concurrency import BackgroundExecutor
+from inventory_cache import InventoryCache
+from inventory_warmup import start_warmup
+
+MAKES = {
+    "VOLKSWAGEN": ["Golf", "Polo", "T-Roc", "Tiguan", "Passat"],
+    "SEAT": ["Ibiza", "Leon", "Arona", "Ateca"],
+    "TOYOTA": ["Corolla", "C-HR", "RAV4", "Yaris"],
+    "BMW": ["Serie 1", "Serie 3", "X1", "X3"],
+    "MERCEDES": ["Clase A", "Clase C", "GLA", "GLC"],
+    "FORD": ["Focus", "Fiesta", "Kuga", "Puma"],
+    "PEUGEOT": ["208", "308", "2008", "3008"]
+}
+FUELS = ["DIESEL", "GASOLINE", "ELECTRIC", "HYBRID", "PLUG_IN_HYBRID"]
+BODY_STYLES = ["BERLINA", "COMPACTO", "CUATRO_POR_CUATRO_SUV", "FAMILIAR", "MONOVOLUMEN", "SUV5P", "COUPE"]
+COLORS = ["Blanco", "Negro", "Gris", "Azul", "Rojo", "Gris Plata"]
+LABELS = ["0", "ECO", "C", "B", ""]
+
+
+def make_vehicle(rng: random.Random) -> dict:
+    make = rng.choice(list(MAKES))
+    return {
+        "vehicleId": str(uuid.UUID(int=rng.getrandbits(128))),
+        "make": make,
+        "model": rng.choice(MAKES[make]),
+        "version": rng.choice(["1.5 TSI", "2.0 TDI", "Hybrid 140", "Style", "Sport"]),
+        "registrationYear": rng.randint(2012, 2025),
+        "pricing": {"price": rng.randrange(6000, 60000, 100)},
+        "kilometers": rng.randrange(0, 220000, 500),
+        "fuel": rng.choice(FUELS),
+        "transmission": rng.choice(["M", "A"]),
+        "bodyStyle": rng.choice(BODY_STYLES),
+        "color": rng.choice(COLORS),
+        "seats": rng.choice([2, 4, 5, 5, 5, 7]),
+        "doors": rng.choice([3, 5]),
+        "power": rng.randrange(70, 300, 5),
+        "cc": rng.choice([999, 1199, 1498, 1598, 1968, 2993]),
+        "ecologicalLabel": rng.choice(LABELS),
+        "vehicleType": "CAR",
+        "dealcarLink": "https://renove.es/coches/segunda-mano",
+        "licensePlate": "0000XXX",
+        "multimediaList": [{"type": "image/jpeg", "url": f"https://cdn.example.com/{i}.jpg"} for i in range(8)],
+        "description": "Vehículo revisado. " * 20,
+        "warranty": "12 meses",
+        "store": "Renove Madrid"
+    }
+
+
+def make_inventory(count: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    return [make_vehicle(rng) for _ in range(count)]
+
+
+class MockDealcarServer:
+    def __init__(self, pages: int, page_size: int = 20, latency: float = 0.15):
+        self.pages = pages
+        self.page_size = page_size
+        self.latency = latency
+        self.vehicles = make_inventory(pages * page_size)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                page = int(query.get("page", ["1"])[0])
+                time.sleep(server.latency)
+                start = (page - 1) * server.page_size
+                body = json.dumps({
+                    "vehicles": server.vehicles[start:start + server.page_size],
+                    "totalPages": server.pages,
+                    "totalElements": len(server.vehicles)
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/stock"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class MockOpenAIServer:
+    def __init__(self, tokens: int = 150, interval: float = 0.01):
+        self.tokens = tokens
+        self.interval = interval
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.endswith("/conversations"):
+                    body = json.dumps({"id": f"conv_{uuid.uuid4().hex}", "object": "conversation", "created_at": 0, "metadata": {}}).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                item = {"type": "message", "id": "msg_1", "role": "assistant", "status": "in_progress", "content": []}
+                self._event({"type": "response.output_item.added", "output_index": 0, "item": item})
+                for i in range(server.tokens):
+                    time.sleep(server.interval)
+                    self._event({"type": "response.output_text.delta", "item_id": "msg_1", "output_index": 0, "content_index": 0, "delta": f"palabra{i} "})
+                self._event({"type": "response.completed", "response": {"id": "resp_1", "object": "response", "status": "completed", "output": []}})
+
+            def _event(self, data: dict):
+                self.wfile.write(f"event: {data['type']}\ndata: {json.dumps(data)}\n\n".encode())
+                self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+SERVER_COMMANDS = {
+    "eventlet": lambda port: [sys.executable, "-m", "gunicorn", "--worker-class", "eventlet", "-w", "1", "--bind", f"127.0.0.1:{port}", "socketio_app:app"],
+    "asgi": lambda port: [sys.executable, "-m", "uvicorn", "asgi_app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+}
+
+
+def process_cpu_seconds(pid: int) -> float:
+    # The server process plus its children (the gunicorn worker), from /proc.
+    ticks = os.sysconf("SC_CLK_TCK")
+    total = 0.0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(entry) == pid or int(fields[1]) == pid:
+            total += (int(fields[11]) + int(fields[12])) / ticks
+    return total
+
+
+def run_chat(url: str, timeout: float, latencies: list, first_tokens: list, failures: list):
+    import socketio
+
+    client = socketio.Client(reconnection=False)
+    finished = threading.Event()
+    first = []
+    client.on("chat_token", lambda data: first.append(time.perf_counter()) if data.get("type") == "text_delta" and not first else None)
+    client.on("message_complete", lambda data: finished.set())
+    try:
+        client.connect(url, transports=["websocket"])
+        started = time.perf_counter()
+        client.emit("message", {"message": "Hola", "session_id": uuid.uuid4().hex})
+        if finished.wait(timeout):
+            latencies.append(time.perf_counter() - started)
+            first_tokens.append(first[0] - started if first else 0.0)
+        else:
+            failures.append("timeout")
+    except Exception as e:
+        failures.append(str(e))
+    finally:
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+
+
+def bench_streams(args):
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    with MockOpenAIServer(args.tokens, args.interval) as openai_mock, tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, OPENAI_API_KEY="benchmark", OPENAI_BASE_URL=openai_mock.url, DEALCAR_API_KEY="",
+                   INVENTORY_REFRESH_INTERVAL_SECONDS="0", PYTHONPATH=backend_dir)
+        print(f"Concurrent chats against each build, mock model streaming {args.tokens} tokens every {args.interval * 1000:.0f}ms")
+        print(f"{'build':>9} {'chats':>6} {'ok':>5} {'wall':>7} {'p50':>7} {'p95':>7} {'ttft50':>7} {'cpu':>7} {'chats/cpu-s':>12}")
+        for build in args.builds:
+            port = args.port
+            server = subprocess.Popen(SERVER_COMMANDS[build](port), cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                for _ in range(100):
+                    try:
+                        urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1)
+                        break
+                    except Exception:
+                        time.sleep(0.2)
+                for chats in args.concurrency:
+                    latencies, first_tokens, failures = [], [], []
+                    cpu_before = process_cpu_seconds(server.pid)
+                    started = time.perf_counter()
+                    threads = [threading.Thread(target=run_chat, args=(f"http://127.0.0.1:{port}", args.timeout, latencies, first_tokens, failures)) for _ in range(chats)]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                    wall = time.perf_counter() - started
+                    cpu = process_cpu_seconds(server.pid) - cpu_before
+                    p50 = statistics.median(latencies) if latencies else 0.0
+                    p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) >= 2 else p50
+                    ttft = statistics.median(first_tokens) if first_tokens else 0.0
+                    print(f"{build:>9} {chats:>6} {len(latencies):>5} {wall:>6.2f}s {p50:>6.2f}s {p95:>6.2f}s {ttft:>6.3f}s {cpu:>6.2f}s {len(latencies) / cpu if cpu else 0:>12.1f}")
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+
+
+def bench_fanout(args):
+    print(f"Cold fetch against mock Dealcar ({args.latency * 1000:.0f}ms per page)")
+    print(f"{'pages':>6} {'sequential':>12} {'concurrent':>12} {'speedup':>8}")
+    for pages in args.pages:
+        with MockDealcarServer(pages, latency=args.latency) as server:
+            tools.DEALCAR_API_URL = server.url
+            timings = []
+            for concurrency in (1, args.concurrency):
+                started = time.perf_counter()
+                result = tools.fetch_dealcar_inventory(concurrency=concurrency)
+                timings.append(time.perf_counter() - started)
+                assert len(result["vehicles"]) == len(server.vehicles), result.get("error")
+        print(f"{pages:>6} {timings[0] * 1000:>10.0f}ms {timings[1] * 1000:>10.0f}ms {timings[0] / timings[1]:>7.1f}x")
+
+
+FILTER_QUERIES = [
+    {"make": "VOLKSWAGEN"},
+    {"body_style": "CUATRO_POR_CUATRO_SUV", "max_price": 20000},
+    {"make": ["SEAT", "TOYOTA"], "model": ["leon", "corolla"], "fuel": "HYBRID"},
+    {"model": ["golf", "c-hr", "x3", "serie"]},
+    {"transmission": "automatic", "year_min": 2019, "max_kilometers": 80000, "min_power": 120},
+    {"ecological_label": "ECO", "min_seats": 5, "max_doors": 5, "color": "gris"}
+]
+
+
+def rowwise_filter(vehicles: list, filters: dict) -> list:
+    # Per-dict scan with the same predicates, as filter_vehicles ran before the columnar engine.
+    predicates = categorical_predicates(filters)
+    filtered = []
+    for vehicle in vehicles:
+        try:
+            if not all(predicate(vehicle.get(CATEGORICAL_COLUMNS[name], "")) for name, predicate in predicates):
+                continue
+            passed = True
+            for key, column, bound_kind in RANGE_FILTERS:
+                bound = filters.get(key)
+                if not bound:
+                    continue
+                value = vehicle.get("pricing", {}).get("price", 0) if column == "price" else vehicle.get(NUMERIC_KEYS[column], 0)
+                if isinstance(value, str):
+                    try:
+                        value = NUMERIC_COLUMNS[column](value)
+                    except (ValueError, TypeError):
+                        value = 0
+                if (bound_kind == "at_most" and value > bound) or (bound_kind == "at_least" and value < bound):
+                    passed = False
+                    break
+            if passed:
+                filtered.append(vehicle)
+        except Exception:
+            continue
+    return filtered
+
+
+def bench_filter(args):
+    print(f"Filter cost per search, averaged over {len(FILTER_QUERIES)} queries x {args.repeat} runs")
+    print(f"{'vehicles':>9} {'build':>10} {'row-wise':>11} {'columnar':>11} {'indexed':>11} {'speedup':>8}")
+    for count in args.sizes:
+        vehicles = make_inventory(count)
+        started = time.perf_counter()
+        columns = InventoryColumns(vehicles)
+        index = FilterIndex(columns)
+        build = time.perf_counter() - started
+
+        rowwise = columnar = indexed = 0.0
+        for filters in FILTER_QUERIES:
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                expected = rowwise_filter(vehicles, filters)
+                rowwise += time.perf_counter() - started
+                started = time.perf_counter()
+                rows = filter_rows(columns, filters)
+                columnar += time.perf_counter() - started
+                started = time.perf_counter()
+                planned = plan_rows(index, filters)
+                indexed += time.perf_counter() - started
+            assert [vehicles[row] for row in rows] == expected, filters
+            assert planned == rows, filters
+        runs = len(FILTER_QUERIES) * args.repeat
+        print(
+            f"{count:>9} {build * 1000:>8.1f}ms {rowwise / runs * 1000:>9.2f}ms {columnar / runs * 1000:>9.3f}ms "
+            f"{indexed / runs * 1000:>9.3f}ms {rowwise / min(columnar, indexed):>7.0f}x"
+        )
+
+
+def bench_format(args):
+    vehicles = make_inventory(args.vehicles)
+    snapshot, _ = build_snapshot({"vehicles": vehicles}, 1, None, tools.format_vehicle_response, tools.format_car_viewer)
+    rng = random.Random(7)
+    searches = [rng.sample(vehicles, 7) for _ in range(args.searches)]
+
+    started = time.perf_counter()
+    for page in searches:
+        cars = [tools.format_vehicle_response(vehicle) for vehicle in page]
+        tools.format_car_viewer(cars[0])
+    before = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for page in searches:
+        cars = [snapshot.formatted(vehicle) for vehicle in page]
+        snapshot.viewer(cars[0])
+    after = time.perf_counter() - started
+
+    print(f"Formatting 7 cards + 1 car_viewer per search, {args.searches} searches over {args.vehicles} vehicles")
+    print(f"{'on demand':>12} {before / args.searches * 1e6:>8.1f}us/search")
+    print(f"{'precomputed':>12} {after / args.searches * 1e6:>8.1f}us/search ({before / after:.0f}x)")
+
+
+def bench_tokens(args):
+    vehicles = make_inventory(args.vehicles)
+    snapshot, _ = build_snapshot({"vehicles": vehicles}, 1, None, tools.format_vehicle_response, tools.format_car_viewer)
+    searches = [
+        {"make": "SEAT"},
+        {"max_price": 20000, "sort_by": "price"},
+        {"body_style": "SUV5P", "year_min": 2020},
+        {"fuel": "ELECTRIC", "max_kilometers": 50000},
+        {"make": ["BMW", "MERCEDES"], "sort_by": "value"}
+    ]
+
+    print(f"get_car_inventory output tokens sent to the model, {args.vehicles} vehicles")
+    print(f"{'search':<52} {'full':>6} {'compact':>8} {'saved':>6}")
+    for arguments in searches:
+        result = tools.search_inventory(snapshot, arguments)
+        full = count_tokens(json.dumps(result))
+        compact = count_tokens(tool_output("get_car_inventory", result))
+        print(f"{json.dumps(arguments):<52} {full:>6} {compact:>8} {1 - compact / full:>6.0%}")
+
+
+def bench_emits(args):
+    rng = random.Random(3)
+    words = ["el", "coche", "tiene", "un", "motor", "de", "150", "CV", "y", "consume", "poco", ",", "."]
+    tokens = [f" {rng.choice(words)}" for _ in range(args.tokens)]
+
+    print(f"One {args.tokens}-token reply, a token every {args.interval * 1000:.0f}ms, chat_token frames JSON-encoded as Socket.IO would")
+    print(f"{'window':>8} {'max chars':>9} {'frames':>7} {'bytes':>7} {'emit cpu':>9}")
+    for window_ms in args.windows:
+        frames = []
+        batcher = TokenBatcher("bench", window_ms, args.max_chars)
+        emit = batched_emit(lambda event, data: frames.append(json.dumps([event, data]).encode()), batcher)
+        cpu = 0.0
+        for token in tokens:
+            time.sleep(args.interval)
+            started = time.process_time()
+            emit("chat_token", {"token": token, "type": "text_delta", "session_id": "bench"})
+            cpu += time.process_time() - started
+        emit("chat_token", {"token": "", "type": "text_complete", "session_id": "bench"})
+        print(f"{window_ms:>6}ms {args.max_chars:>9} {batcher.frames:>7} {sum(map(len, frames)):>7} {cpu * 1000:>7.2f}ms")
+
+
+def legacy_should_filter_token(token: str, state: dict) -> bool:
+    for char in token:
+        if char in '{[':
+            state['json_depth'] += 1
+            state['is_json_block'] = True
+        elif char in '}]':
+            state['json_depth'] -= 1
+            if state['json_depth'] <= 0:
+                state['is_json_block'] = False
+                state['json_depth'] = 0
+    return state['is_json_block'] or state['json_depth'] > 0
+
+
+def streamed_reply(tokens: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    prose = ["Te", " recomiendo", " el", " SEAT", " León", ",", " tiene", " 150", " CV", " y", " solo", " 40.000", " km", "."]
+    block = list(json.dumps({"vehicleId": "62cb7a7f", "note": "incluye {llantas} y [extras]", "price": 18900}))
+    reply = []
+    while len(reply) < tokens:
+        reply.extend(rng.choice(prose) for _ in range(40))
+        reply.extend("".join(block[i:i + 4]) for i in range(0, len(block), 4))
+    return reply[:tokens]
+
+
+def bench_jsonfilter(args):
+    reply = streamed_reply(args.tokens)
+
+    started = time.perf_counter()
+    for _ in range(args.replies):
+        json_depth, is_json_block = 0, False
+        for token in reply:
+            filter_state = {'json_depth': json_depth, 'is_json_block': is_json_block}
+            legacy_should_filter_token(token, filter_state)
+            json_depth = filter_state['json_depth']
+            is_json_block = filter_state['is_json_block']
+    legacy = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.replies):
+        json_filter = JsonBlockFilter()
+        for token in reply:
+            json_filter.feed(token)
+    current = time.perf_counter() - started
+
+    print(f"Filtering a {args.tokens}-token streamed reply with inline JSON blocks, {args.replies} replies")
+    print(f"{'per-char loop':>14} {legacy / args.replies * 1000:>8.3f}ms/reply")
+    print(f"{'JsonBlockFilter':>14} {current / args.replies * 1000:>8.3f}ms/reply ({legacy / current:.1f}x)")
+
+
+def argument_deltas(arguments: dict, size: int = 4) -> list:
+    text = json.dumps(arguments)
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def timed_search(deltas: list, interval: float, cache: InventoryCache, warm: bool) -> float:
+    func_call = {'call_id': 'bench', 'name': 'get_car_inventory', 'arguments': ''}
+    func_call['warmup'] = start_warmup(cache, func_call['name']) if warm else None
+    for delta in deltas:
+        time.sleep(interval)
+        func_call['arguments'] += delta
+        if func_call['warmup']:
+            func_call['warmup'].feed(func_call['arguments'])
+    batch = ToolCallBatch(BackgroundExecutor().submit, 1)
+    batch.dispatch(func_call, lambda name, arguments: tools.execute_tool(name, arguments))
+    call = batch.gather()[0]
+    assert call.error is None and "cars" in call.result, call.error or call.result
+    return call.seconds
+
+
+def bench_warmup(args):
+    vehicles = make_inventory(args.vehicles)
+
+    def fetch():
+        time.sleep(args.latency)
+        return {"vehicles": vehicles, "totalElements": len(vehicles)}
+
+    deltas = argument_deltas({"make": "Volkswagn", "body_style": "SUV5P", "max_price": 25000})
+    print(f"get_car_inventory, arguments streamed in {len(deltas)} deltas {args.interval * 1000:.0f}ms apart, "
+          f"{args.vehicles} vehicles, {args.latency * 1000:.0f}ms inventory fetch")
+    print(f"{'snapshot':<9} {'cold':>9} {'warmed':>9}")
+    for stale in (True, False):
+        timings = {}
+        for warm in (False, True):
+            samples = []
+            for _ in range(args.repeat):
+                cache = InventoryCache(fetch, tools.format_vehicle_response, ttl_seconds=600, refresh_interval_seconds=0, viewer_formatter=tools.format_car_viewer)
+                cache.refresh()
+                if stale:
+                    cache.peek().fetched_at -= 601
+                tools.inventory_cache = cache
+                tools.search_cache.clear()
+                samples.append(timed_search(deltas, args.interval, cache, warm))
+            timings[warm] = statistics.median(samples)
+        print(f"{'stale' if stale else 'fresh':<9} {timings[False] * 1000:>7.1f}ms {timings[True] * 1000:>7.1f}ms")
+
+
+NAME_STOCK = [
+    ("PEUGEOT", "2008"), ("PEUGEOT", "208"), ("BMW", "Serie 1"), ("BMW", "X3"), ("MERCEDES", "Clase C"),
+    ("TESLA", "Model Y"), ("VOLKSWAGEN", "Golf"), ("VOLKSWAGEN", "Tiguan"), ("TOYOTA", "Corolla"), ("KIA", "Niro"),
+    ("DACIA", "Sandero"), ("ALPINA", "B3")
+]
+# (arguments, expected make, expected model): models missing from stock must stay as asked so the search comes back empty.
+NAME_CASES = [
+    ({"make": "Peugeot", "model": "3008"}, "Peugeot", "3008"),
+    ({"make": "Peugeot", "model": "5008"}, "Peugeot", "5008"),
+    ({"make": "BMW", "model": "Serie 3"}, "BMW", "Serie 3"),
+    ({"make": "Mercedes", "model": "Clase A"}, "Mercedes", "Clase A"),
+    ({"make": "Mercedes", "model": "Class A"}, "Mercedes", "Class A"),
+    ({"make": "Tesla", "model": "Model 3"}, "Tesla", "Model 3"),
+    ({"model": "3008"}, None, "3008"),
+    ({"make": "Volkswagn", "model": "Tiguna"}, "VOLKSWAGEN", "tiguan"),
+    ({"make": "VW", "model": "Golff"}, "VOLKSWAGEN", "golf"),
+    ({"make": "Toyota", "model": "Corola"}, "Toyota", "corolla"),
+    ({"make": "Kia", "model": "Corola"}, "Kia", "Corola"),
+    ({"make": "Mercedes", "model": "class c"}, "Mercedes", "clase c"),
+    ({"make": "Lancia"}, "Lancia", None),
+    ({"make": "Alpine"}, "Alpine", None),
+    ({"make": "Dacya"}, "DACIA", None)
+]
+
+
+def bench_names(args):
+    vehicles = make_inventory(len(NAME_STOCK))
+    for vehicle, (make, model) in zip(vehicles, NAME_STOCK):
+        vehicle["make"], vehicle["model"] = make, model
+    resolver = NameResolver(InventoryColumns(vehicles))
+
+    failures = 0
+    for arguments, make, model in NAME_CASES:
+        resolved, corrections = resolver.resolve_filters(arguments)
+        ok = resolved.get("make") == make and resolved.get("model") == model
+        failures += not ok
+        print(f"{'ok' if ok else 'FAIL':<5} {json.dumps(arguments, ensure_ascii=False):<44} -> {json.dumps(corrections, ensure_ascii=False)}")
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        resolver.clear_memo()
+        for arguments, _, _ in NAME_CASES:
+            resolver.resolve_filters(arguments)
+    print(f"{(time.perf_counter() - started) / (args.repeat * len(NAME_CASES)) * 1000:.3f}ms per uncached resolution")
+    if failures:
+        sys.exit(f"{failures} name resolution cases failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Renove backend benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fanout = subparsers.add_parser("fanout", help="Cold Dealcar fetch time vs page count")
+    fanout.add_argument("--pages", type=int, nargs="+", default=[1, 5, 10, 15, 20])
+    fanout.add_argument("--latency", type=float, default=0.15)
+    fanout.add_argument("--concurrency", type=int, default=tools.settings.dealcar_fetch_concurrency)
+    fanout.set_defaults(func=bench_fanout)
+
+    filtering = subparsers.add_parser("filter", help="Row-wise vs columnar vs indexed filter time vs inventory size")
+    filtering.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    filtering.add_argument("--repeat", type=int, default=3)
+    filtering.set_defaults(func=bench_filter)
+
+    formatting = subparsers.add_parser("format", help="Per-search formatting cost, on demand vs precomputed")
+    formatting.add_argument("--vehicles", type=int, default=2000)
+    formatting.add_argument("--searches", type=int, default=5000)
+    formatting.set_defaults(func=bench_format)
+
+    tokens = subparsers.add_parser("tokens", help="get_car_inventory output tokens, full vs compact projection")
+    tokens.add_argument("--vehicles", type=int, default=2000)
+    tokens.set_defaults(func=bench_tokens)
+
+    streams = subparsers.add_parser("streams", help="Concurrent chat streams and server CPU, eventlet vs ASGI build (needs gunicorn, uvicorn, python-socketio[client])")
+    streams.add_argument("--builds", nargs="+", choices=list(SERVER_COMMANDS), default=list(SERVER_COMMANDS))
+    streams.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 100, 200])
+    streams.add_argument("--tokens", type=int, default=150)
+    streams.add_argument("--interval", type=float, default=0.01)
+    streams.add_argument("--timeout", type=float, default=60.0)
+    streams.add_argument("--port", type=int, default=5055)
+    streams.set_defaults(func=bench_streams)
+
+    emits = subparsers.add_parser("emits", help="chat_token frames and emit CPU per reply vs coalescing window")
+    emits.add_argument("--windows", type=int, nargs="+", default=[0, 20, 40, 80])
+    emits.add_argument("--max-chars", type=int, default=tools.settings.chat_token_max_chars)
+    emits.add_argument("--tokens", type=int, default=300)
+    emits.add_argument("--interval", type=float, default=0.005)
+    emits.set_defaults(func=bench_emits)
+
+    jsonfilter = subparsers.add_parser("jsonfilter", help="Inline JSON suppression cost per streamed reply, per-char loop vs JsonBlockFilter")
+    jsonfilter.add_argument("--tokens", type=int, default=4000)
+    jsonfilter.add_argument("--replies", type=int, default=200)
+    jsonfilter.set_defaults(func=bench_jsonfilter)
+
+    warmup = subparsers.add_parser("warmup", help="Time from arguments.done to get_car_inventory result, with and without speculative warm-up")
+    warmup.add_argument("--vehicles", type=int, default=5000)
+    warmup.add_argument("--latency", type=float, default=0.4)
+    warmup.add_argument("--interval", type=float, default=0.02)
+    warmup.add_argument("--repeat", type=int, default=5)
+    warmup.set_defaults(func=bench_warmup)
+
+    names = subparsers.add_parser("names", help="Make/model typo resolution: correctness cases and cost per lookup")
+    names.add_argument("--repeat", type=int, default=200)
+    names.set_defaults(func=bench_names)
+
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,632 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from inventory_cache import InventoryCache
+from inventory_warmup import start_warmup
+from tool_projection import tool_output
+
+logger = logging.getLogger(__name__)
+
+TOOL_STATUS = {
+    'get_car_inventory': 'searching_inventory',
+    'get_inventory_facets': 'searching_inventory',
+    'book_test_drive': 'booking_appointment',
+    'get_financing_options': 'calculating_financing'
+}
+TOOL_UI_ELEMENTS = {
+    'book_test_drive': 'booking_confirmation',
+    'get_financing_options': 'financing_table'
+}
+BODY_STYLE_NAMES = {
+    'COUPE': 'coupés', 'CABRIO': 'descapotables', 'BERLINA': 'berlinas',
+    'COMPACTO': 'compactos', 'FAMILIAR': 'familiares',
+    'CUATRO_POR_CUATRO_SUV': 'SUVs', 'MONOVOLUMEN': 'monovolúmenes'
+}
+ERROR_FALLBACK_MESSAGE = "Lo siento, ha ocurrido un problema procesando tu solicitud. ¿Podrías reformular tu pregunta o contarme más sobre lo que buscas?"
+
+
+# Drops inline JSON blocks from streamed model text; feed() returns the part of each delta to show.
+# Braces and brackets inside JSON string literals (including escaped quotes) do not change the nesting depth.
+class JsonBlockFilter:
+    OPENER = re.compile(r'[{\[]')
+    STRUCTURE = re.compile(r'[{}\[\]"]')
+    STRING = re.compile(r'["\\]')
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, token: str) -> str:
+        if self.depth == 0:
+            if '{' not in token and '[' not in token:
+                return token
+            match = self.OPENER.search(token)
+            visible = [token[:match.start()]]
+            self.depth = 1
+            pos = match.end()
+        else:
+            visible = []
+            pos = 0
+
+        end = len(token)
+        while pos < end:
+            if self.depth == 0:
+                match = self.OPENER.search(token, pos)
+                if match is None:
+                    visible.append(token[pos:])
+                    break
+                visible.append(token[pos:match.start()])
+                self.depth = 1
+                pos = match.end()
+            elif self.escaped:
+                self.escaped = False
+                pos += 1
+            elif self.in_string:
+                match = self.STRING.search(token, pos)
+                if match is None:
+                    break
+                if match.group() == '\\':
+                    self.escaped = True
+                else:
+                    self.in_string = False
+                pos = match.end()
+            else:
+                match = self.STRUCTURE.search(token, pos)
+                if match is None:
+                    break
+                char = match.group()
+                if char == '"':
+                    self.in_string = True
+                elif char in '{[':
+                    self.depth += 1
+                else:
+                    self.depth -= 1
+                pos = match.end()
+        return "".join(visible)
+
+
+def cars_to_display(result: Dict[str, Any], arguments: Dict[str, Any]) -> List[Dict[str, Any]]:
+    cars = result.get('cars', [])
+    display_ids = arguments.get('display_ids', [])
+    if display_ids:
+        id_to_car = {car.get('vehicleId'): car for car in cars}
+        return [id_to_car[cid] for cid in display_ids if cid in id_to_car]
+    return cars[:7]
+
+
+# How a near miss's compromise is put to the customer: widened filters get the new value, dropped ones a phrase.
+RELAXED_WIDENED = {
+    'max_price': "subiendo el presupuesto a {}€",
+    'min_price': "bajando el precio mínimo a {}€",
+    'year_min': "desde el año {}",
+    'max_kilometers': "con hasta {} km",
+    'min_power': "desde {} CV"
+}
+RELAXED_DROPPED = {
+    'color': "en otro color", 'version': "en otra versión", 'ecological_label': "con otra etiqueta",
+    'transmission': "con otro tipo de cambio", 'fuel': "con otro combustible", 'body_style': "con otra carrocería",
+    'model': "en otros modelos", 'year_min': "de cualquier año", 'max_price': "sin límite de presupuesto"
+}
+
+
+def _thousands(value: Any) -> str:
+    return f"{value:,.0f}".replace(",", ".") if isinstance(value, (int, float)) else str(value)
+
+
+def _euros(value: Any) -> str:
+    return _thousands(value) + "€" if isinstance(value, (int, float)) else ""
+
+
+def _relaxed_phrase(original: Dict[str, Any], relaxed: Dict[str, Any]) -> str:
+    phrases = []
+    for key, value in original.items():
+        if key not in relaxed and value:
+            phrases.append(RELAXED_DROPPED.get(key, "sin ese filtro"))
+        elif key in RELAXED_WIDENED and relaxed.get(key) != value:
+            new_value = relaxed.get(key)
+            phrases.append(RELAXED_WIDENED[key].format(new_value if key in ('year_min', 'min_power') else _thousands(new_value)))
+    return ", ".join(dict.fromkeys(phrases))
+
+
+def _near_miss_line(original: Dict[str, Any], miss: Dict[str, Any]) -> str:
+    examples = []
+    for car in miss.get('cars', [])[:2]:
+        if isinstance(car, dict):
+            details = ", ".join(part for part in (str(car.get('year') or ''), _euros(car.get('price'))) if part)
+            examples.append(f"{car.get('make', '')} {car.get('model', '')}".strip() + (f" ({details})" if details else ""))
+    total = miss.get('total_matches', len(miss.get('cars', [])))
+    line = f"• {_relaxed_phrase(original, miss.get('arguments', {})).capitalize() or 'Con filtros parecidos'}: {total} {'coche' if total == 1 else 'coches'}"
+    return line + (f", por ejemplo {' y '.join(examples)}" if examples else "")
+
+
+def no_results_message(last_search_args: Dict[str, Any], near_misses: Optional[List[Dict[str, Any]]] = None) -> str:
+    vehicle_desc = "ese vehículo"
+    if last_search_args.get('make'):
+        vehicle_desc = last_search_args['make']
+        if last_search_args.get('model'):
+            vehicle_desc += f" {last_search_args['model']}"
+    elif last_search_args.get('body_style'):
+        vehicle_desc = BODY_STYLE_NAMES.get(last_search_args['body_style'], 'ese tipo de vehículo')
+
+    budget_phrase = f" dentro de ese presupuesto" if last_search_args.get('max_price') else ""
+    near_misses = [miss for miss in near_misses or [] if isinstance(miss, dict)]
+    if near_misses:
+        lines = "\n".join(_near_miss_line(last_search_args, miss) for miss in near_misses)
+        return f"""Ahora mismo no tenemos {vehicle_desc}{budget_phrase} en stock en Renove, pero hay opciones muy cercanas:
+
+{lines}
+
+¿Quieres que te las enseñe? Si prefieres exactamente lo que buscabas, también puedo solicitarlo como vehículo a la carta a través de nuestros proveedores."""
+    return f"""Ahora mismo no tenemos {vehicle_desc}{budget_phrase} en stock en Renove.
+
+Si quieres, puedo solicitarlo como vehículo a la carta a través de nuestros proveedores. Para tramitarlo, dime por favor en un solo mensaje:
+
+• Nombre y apellidos
+• Teléfono
+• Especificaciones del coche que buscas: presupuesto máximo, año mínimo, km máximos, combustible, y si tienes preferencia de cambio, color o equipamiento."""
+
+
+def _is_text_delta(event: str, data: Dict[str, Any]) -> bool:
+    return event == 'chat_token' and data.get('type') == 'text_delta'
+
+
+class TokenBatcher:
+    def __init__(self, session_id: str, window_ms: float, max_chars: int):
+        self.session_id = session_id
+        self.window = window_ms / 1000
+        self.max_chars = max_chars
+        self._parts: List[str] = []
+        self._size = 0
+        self._opened_at = 0.0
+        # Bumped on every drain, so a timed flush scheduled for one buffer never drains the next one early.
+        self.generation = 0
+        self.tokens = 0
+        self.frames = 0
+        self.emit_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def add(self, token: str) -> Optional[str]:
+        if not self._parts:
+            self._opened_at = time.perf_counter()
+        self._parts.append(token)
+        self._size += len(token)
+        self.tokens += 1
+        if self._size >= self.max_chars or time.perf_counter() - self._opened_at >= self.window:
+            return self.drain()
+        return None
+
+    def drain(self) -> Optional[str]:
+        if not self._parts:
+            return None
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        self.generation += 1
+        return text
+
+    @property
+    def empty(self) -> bool:
+        return not self._parts
+
+    def frame(self, text: str) -> Dict[str, Any]:
+        self.frames += 1
+        return {'token': text, 'type': 'text_delta', 'session_id': self.session_id}
+
+    def finish(self):
+        # Invalidates any timed flush still pending, so nothing is sent for this turn once it is over.
+        self.generation += 1
+        stream_stats.record(self)
+        logger.info(
+            f"[STREAM] {self.session_id}: {self.tokens} tokens in {self.frames} chat_token frames, "
+            f"{self.emit_seconds * 1000:.1f}ms emitting over {time.perf_counter() - self.started:.2f}s"
+        )
+
+
+def batched_emit(
+    emit_fn: Callable[[str, Dict[str, Any]], Any], batcher: TokenBatcher,
+    schedule_fn: Optional[Callable[..., Any]] = None
+) -> Callable[[str, Dict[str, Any]], bool]:
+    # text_delta tokens are coalesced; any other event first flushes what is pending so the client sees text
+    # and ui_element/status/text_complete in the original order. Returns True when something was sent.
+    # schedule_fn(delay, fn, *args) runs fn later; it flushes a buffer the window after it opened even when the
+    # model pauses and no next token arrives to trigger the flush.
+    lock = threading.Lock()
+
+    def flush(generation: int):
+        with lock:
+            if batcher.generation != generation:
+                return
+            text = batcher.drain()
+            if text is not None:
+                emit_fn('chat_token', batcher.frame(text))
+
+    def emit(event: str, data: Dict[str, Any]) -> bool:
+        with lock:
+            started = time.perf_counter()
+            if _is_text_delta(event, data):
+                opened = batcher.empty
+                text = batcher.add(data['token'])
+                if text is not None:
+                    emit_fn('chat_token', batcher.frame(text))
+                elif opened and schedule_fn is not None:
+                    schedule_fn(batcher.window, flush, batcher.generation)
+            else:
+                text = batcher.drain()
+                if text is not None:
+                    emit_fn('chat_token', batcher.frame(text))
+                emit_fn(event, data)
+            batcher.emit_seconds += time.perf_counter() - started
+        return text is not None or not _is_text_delta(event, data)
+    return emit
+
+
+def async_batched_emit(emit_fn: Callable[[str, Dict[str, Any]], Any], batcher: TokenBatcher, timed_flush: bool = True):
+    lock = asyncio.Lock()
+
+    async def flush(generation: int):
+        async with lock:
+            if batcher.generation != generation:
+                return
+            text = batcher.drain()
+            if text is not None:
+                await emit_fn('chat_token', batcher.frame(text))
+
+    async def emit(event: str, data: Dict[str, Any]) -> bool:
+        async with lock:
+            started = time.perf_counter()
+            if _is_text_delta(event, data):
+                opened = batcher.empty
+                text = batcher.add(data['token'])
+                if text is not None:
+                    await emit_fn('chat_token', batcher.frame(text))
+                elif opened and timed_flush:
+                    generation = batcher.generation
+                    asyncio.get_running_loop().call_later(batcher.window, lambda: asyncio.ensure_future(flush(generation)))
+            else:
+                text = batcher.drain()
+                if text is not None:
+                    await emit_fn('chat_token', batcher.frame(text))
+                await emit_fn(event, data)
+            batcher.emit_seconds += time.perf_counter() - started
+        return text is not None or not _is_text_delta(event, data)
+    return emit
+
+
+class StreamStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.tokens = 0
+        self.frames = 0
+        self.emit_seconds = 0.0
+
+    def record(self, batcher: TokenBatcher):
+        with self._lock:
+            self.turns += 1
+            self.tokens += batcher.tokens
+            self.frames += batcher.frames
+            self.emit_seconds += batcher.emit_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "tokens": self.tokens,
+                "frames": self.frames,
+                "frames_per_turn": round(self.frames / self.turns, 1) if self.turns else 0.0,
+                "tokens_per_frame": round(self.tokens / self.frames, 1) if self.frames else 0.0,
+                "emit_ms_per_turn": round(self.emit_seconds * 1000 / self.turns, 2) if self.turns else 0.0
+            }
+
+
+stream_stats = StreamStats()
+
+
+class ToolCall:
+    def __init__(self, call_id: Optional[str], name: Optional[str]):
+        self.call_id = call_id
+        self.name = name
+        self.arguments: Optional[Dict[str, Any]] = None
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+        self.seconds = 0.0
+        self.handle: Any = None
+        self.warmup: Any = None
+
+
+# Tool calls start as soon as their arguments are complete and run while the model stream keeps being read;
+# gather() waits for all of them and returns them in the order the model issued them.
+# At most max_parallel calls of one model response run at once; the limit is per response, not per process.
+class ToolCallBatch:
+    def __init__(self, submit_fn: Callable[[Callable[[], Any]], Any], max_parallel: int):
+        self.submit_fn = submit_fn
+        self._slots = threading.BoundedSemaphore(max(1, max_parallel))
+        self.calls: List[ToolCall] = []
+        self.started = time.perf_counter()
+
+    def dispatch(self, func_call: Dict[str, Any], run: Callable[[str, Dict[str, Any]], Any]) -> ToolCall:
+        call = ToolCall(func_call.get('call_id'), func_call.get('name'))
+        call.warmup = func_call.get('warmup')
+        self.calls.append(call)
+        try:
+            call.arguments = json.loads(func_call['arguments'])
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            call.error = e
+            return call
+
+        # Timed from dispatch, i.e. from arguments.done, so time spent queued for a worker is included.
+        started = time.perf_counter()
+
+        def timed():
+            try:
+                with self._slots:
+                    return run(call.name, call.arguments)
+            finally:
+                call.seconds = time.perf_counter() - started
+
+        call.handle = self.submit_fn(timed)
+        return call
+
+    def gather(self) -> List[ToolCall]:
+        for call in self.calls:
+            if call.handle is not None:
+                try:
+                    call.result = call.handle()
+                except Exception as e:
+                    call.error = e
+                call.handle = None
+        self._report()
+        return self.calls
+
+    async def gather_async(self) -> List[ToolCall]:
+        for call in self.calls:
+            if call.handle is not None:
+                try:
+                    call.result = await call.handle
+                except Exception as e:
+                    call.error = e
+                call.handle = None
+        self._report()
+        return self.calls
+
+    def _report(self):
+        if not self.calls:
+            return
+        for call in self.calls:
+            tool_timings.record(call)
+            if call.warmup is not None and call.error is None:
+                call.warmup.finish(call.seconds)
+        timings = ", ".join(f"{call.name}={call.seconds * 1000:.0f}ms" for call in self.calls)
+        logger.info(f"[TOOLS] {len(self.calls)} calls, {(time.perf_counter() - self.started) * 1000:.0f}ms wall: {timings}")
+
+
+class ToolTimings:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tools: Dict[str, Dict[str, float]] = {}
+
+    def record(self, call: ToolCall):
+        with self._lock:
+            totals = self.tools.setdefault(call.name or "unknown", {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            totals["calls"] += 1
+            totals["errors"] += call.error is not None
+            totals["total_ms"] += call.seconds * 1000
+            totals["max_ms"] = max(totals["max_ms"], call.seconds * 1000)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: dict(totals, total_ms=round(totals["total_ms"], 1), max_ms=round(totals["max_ms"], 1), avg_ms=round(totals["total_ms"] / totals["calls"], 1))
+                for name, totals in self.tools.items()
+            }
+
+
+tool_timings = ToolTimings()
+
+
+MAX_FOLLOW_UP_ROUNDS = 5
+Frame = Tuple[str, Dict[str, Any]]
+
+
+def _function_output(call_id: str, output: str) -> Dict[str, Any]:
+    return {"type": "function_call_output", "call_id": call_id, "output": output}
+
+
+# One user message: the first model response, then follow-up responses that consume tool outputs.
+# ChatTurn decides what to send and what to feed back to the model; socketio_app (sync) and asgi_app (async)
+# only own the model stream and the socket, pass every event through handle() and send the frames it returns.
+class ChatTurn:
+    def __init__(
+        self, session_id: str, run_tool: Callable[[str, Dict[str, Any]], Any],
+        submit_fn: Callable[[Callable[[], Any]], Any], max_parallel: int, compact_outputs: bool,
+        viewer_fn: Callable[[Dict[str, Any]], Dict[str, Any]], inventory_cache: Optional[InventoryCache] = None
+    ):
+        self.session_id = session_id
+        self.run_tool = run_tool
+        self.submit_fn = submit_fn
+        self.max_parallel = max_parallel
+        self.compact_outputs = compact_outputs
+        self.viewer_fn = viewer_fn
+        self.inventory_cache = inventory_cache
+        self.round = 0
+        self.text_emitted = False
+        self.follow_up_text_emitted = False
+        self.no_results_args: Optional[Dict[str, Any]] = None
+        self.no_results_near_misses: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def follow_up(self) -> bool:
+        return self.round > 1
+
+    def processing(self) -> List[Frame]:
+        return [('status', {'status': 'processing', 'message': 'Procesando tu mensaje...', 'session_id': self.session_id})]
+
+    def text_start(self) -> List[Frame]:
+        return [('chat_token', {'token': '', 'type': 'text_start', 'session_id': self.session_id})]
+
+    def start_round(self, input_items: Any):
+        self.round += 1
+        if self.follow_up:
+            logger.info(f"[CHAT] Follow-up round {self.round - 1}, submitting {len(input_items)} outputs")
+        self.json_filter = JsonBlockFilter()
+        self.current: Dict[str, Any] = {}
+        self.outputs: List[Dict[str, Any]] = []
+        self.has_function_calls = False
+        self.round_text_emitted = False
+        self.empty_items = 0
+        self.stopped = False
+        self.tool_calls = ToolCallBatch(self.submit_fn, self.max_parallel)
+
+    def _text(self, token: Optional[str]) -> List[Frame]:
+        visible = self.json_filter.feed(token) if token else ''
+        if not visible:
+            return []
+        self.text_emitted = self.round_text_emitted = True
+        if self.follow_up:
+            self.follow_up_text_emitted = True
+        return [('chat_token', {'token': visible, 'type': 'text_delta', 'session_id': self.session_id})]
+
+    def handle(self, event: Any) -> List[Frame]:
+        if event.type == "response.output_item.added":
+            item = event.output_item if hasattr(event, 'output_item') else event.item
+            item_type = getattr(item, 'type', 'unknown')
+            if item_type == 'message' and self.follow_up:
+                self.empty_items += 1
+                if self.empty_items > 10:
+                    logger.warning(f"[CHAT] Too many empty items ({self.empty_items}), breaking")
+                    self.stopped = True
+            elif item_type == 'function_call':
+                self.empty_items = 0
+                self.has_function_calls = True
+                name = getattr(item, 'name', None)
+                self.current = {
+                    'call_id': getattr(item, 'call_id', None),
+                    'name': name,
+                    'arguments': '',
+                    'warmup': start_warmup(self.inventory_cache, name) if self.inventory_cache is not None else None
+                }
+                logger.info(f"[CHAT] Function call detected: {name}")
+                if name and not self.follow_up:
+                    return [('status', {
+                        'status': TOOL_STATUS.get(name, 'processing'),
+                        'message': f'Procesando {name}...',
+                        'session_id': self.session_id,
+                        'show_skeleton': True
+                    })]
+
+        elif event.type == "response.function_call_arguments.delta":
+            if hasattr(event, 'delta') and self.current:
+                self.current['arguments'] += event.delta
+                if self.current.get('warmup'):
+                    self.current['warmup'].feed(self.current['arguments'])
+
+        elif event.type == "response.function_call_arguments.done":
+            if self.current.get('name') and self.current.get('arguments'):
+                logger.info(f"[CHAT] Executing {self.current['name']}, args: {self.current['arguments']}")
+                self.tool_calls.dispatch(self.current, self.run_tool)
+            elif self.follow_up and self.current.get('call_id'):
+                self.outputs.append(_function_output(self.current['call_id'], json.dumps({"error": "execution failed"})))
+
+        elif event.type == "response.output_text.delta":
+            self.empty_items = 0
+            return self._text(getattr(event, 'delta', None))
+
+        elif event.type == "response.content_part.added" and self.follow_up:
+            text = getattr(getattr(event, 'content_part', None), 'text', None)
+            if text:
+                self.empty_items = 0
+                return self._text(text)
+
+        elif event.type == "response.output_item.chunk" and not self.follow_up:
+            content = getattr(event.output_item, 'content', None)
+            if content:
+                return self._text(getattr(content[0], 'text', None))
+
+        elif event.type == "response.completed" and self.follow_up:
+            logger.info(f"[CHAT] Follow-up round {self.round - 1} completed")
+            self.stopped = True
+
+        return []
+
+    def _display(self, call: ToolCall) -> List[Frame]:
+        result = call.result
+        if call.name == 'get_car_inventory':
+            if not isinstance(result, dict) or 'cars' not in result:
+                return []
+            displayed = cars_to_display(result, call.arguments)
+            if len(displayed) == 1:
+                return [('ui_element', {'type': 'car_viewer', 'data': self.viewer_fn(displayed[0]), 'function': call.name, 'session_id': self.session_id})]
+            if len(displayed) > 1:
+                return [('ui_element', {'type': 'car_cards', 'data': {'cars': displayed}, 'function': call.name, 'session_id': self.session_id})]
+            return []
+        if call.name in TOOL_UI_ELEMENTS:
+            return [('ui_element', {'type': TOOL_UI_ELEMENTS[call.name], 'data': result, 'function': call.name, 'session_id': self.session_id})]
+        return []
+
+    def finish_round(self, calls: List[ToolCall]) -> List[Frame]:
+        frames: List[Frame] = []
+        for call in calls:
+            if call.error is not None:
+                logger.error(f"[CHAT] Tool '{call.name}' failed: {str(call.error)}")
+                if not self.follow_up:
+                    frames.append(('error', {'message': f'Error al ejecutar herramienta: {str(call.error)}', 'session_id': self.session_id}))
+                if call.call_id:
+                    error = str(call.error) if not self.follow_up else "execution failed"
+                    self.outputs.append(_function_output(call.call_id, json.dumps({"error": error})))
+                continue
+
+            result = call.result
+            if isinstance(result, dict) and 'error' in result:
+                logger.error(f"[CHAT] Tool '{call.name}' returned error: {result['error']}")
+            if self.follow_up:
+                frames += self._display(call)
+            elif call.name == 'get_car_inventory':
+                # Cars are shown once the model has written about them, in the follow-up round.
+                logger.info(f"[CHAT] get_car_inventory: {len(result.get('cars', [])) if isinstance(result, dict) else 0} cars found, deferring display to follow-up")
+            else:
+                frames += self._display(call)
+
+            if call.call_id:
+                if result or not self.follow_up:
+                    self.outputs.append(_function_output(call.call_id, tool_output(call.name, result, self.compact_outputs)))
+                else:
+                    self.outputs.append(_function_output(call.call_id, json.dumps({"error": "execution failed"})))
+            if not self.follow_up and isinstance(result, dict) and 'cars' in result and not result['cars']:
+                self.no_results_args = call.arguments
+                self.no_results_near_misses = result.get('near_misses')
+        return frames
+
+    def failed(self, error: Exception):
+        logger.exception(f"[CHAT] Exception in follow-up round {self.round - 1}: {str(error)}")
+
+    def next_input(self) -> Optional[List[Dict[str, Any]]]:
+        if self.follow_up and self.round_text_emitted:
+            logger.info(f"[CHAT] Text emitted in round {self.round - 1}, done")
+            return None
+        if not self.has_function_calls or not self.outputs:
+            if self.follow_up:
+                logger.info(f"[CHAT] No text and no function calls in round {self.round - 1}, stopping")
+            return None
+        if self.round > MAX_FOLLOW_UP_ROUNDS:
+            return None
+        return self.outputs
+
+    def closing(self) -> List[Frame]:
+        frames: List[Frame] = []
+        ready = ('status', {'status': 'ready', 'message': '', 'session_id': self.session_id, 'show_skeleton': False})
+        if self.no_results_args is not None and not self.follow_up_text_emitted:
+            logger.info(f"[CHAT] Sending fallback message for empty results")
+            frames += [ready, ('chat_token', {'token': no_results_message(self.no_results_args, self.no_results_near_misses), 'type': 'text_delta', 'session_id': self.session_id})]
+            self.text_emitted = True
+        if not self.text_emitted:
+            logger.warning(f"[CHAT] No text tokens were emitted during entire conversation - sending fallback message")
+            frames += [ready, ('chat_token', {'token': ERROR_FALLBACK_MESSAGE, 'type': 'text_delta', 'session_id': self.session_id})]
+        frames.append(('chat_token', {'token': '', 'type': 'text_complete', 'session_id': self.session_id}))
+        frames.append(('message_complete', {'session_id': self.session_id, 'status': 'done'}))
+        return frames
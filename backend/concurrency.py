@@ -0,0 +1,120 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_semaphores_lock = threading.Lock()
+
+
+def is_green() -> bool:
+    if 'eventlet' not in sys.modules:
+        return False
+    from eventlet import patcher
+    return patcher.is_monkey_patched('socket')
+
+
+def bounded_map(fn: Callable[[Any], Any], items: Iterable[Any], max_workers: int) -> List[Any]:
+    items = list(items)
+    if not items:
+        return []
+    workers = max(1, min(max_workers, len(items)))
+    if workers == 1:
+        return [fn(item) for item in items]
+
+    if is_green():
+        import eventlet
+        pool = eventlet.GreenPool(workers)
+        return list(pool.imap(fn, items))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fn, items))
+
+
+def run_off_hub(fn: Callable[..., Any], *args) -> Any:
+    # Pure-CPU work (e.g. rebuilding the inventory snapshot) runs in eventlet's native thread pool so the hub keeps
+    # serving other sockets meanwhile. Outside eventlet the caller is already an OS thread, so it just runs inline.
+    if is_green():
+        from eventlet import tpool
+        return tpool.execute(fn, *args)
+    return fn(*args)
+
+
+class BackgroundExecutor:
+    # Shared by every session, so it never blocks the caller: green threads are spawned freely and the thread pool
+    # only queues. Callers that need a limit apply their own (see ToolCallBatch) so one busy chat cannot stall the rest.
+    def __init__(self, max_threads: int = 64):
+        self.max_threads = max(1, max_threads)
+        self._lock = threading.Lock()
+        self._threads: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, fn: Callable[[], Any]) -> Callable[[], Any]:
+        # Returns a callable that blocks until fn finishes and returns its result (or raises its error).
+        if is_green():
+            import eventlet
+            return eventlet.spawn(fn).wait
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="tool")
+        return self._threads.submit(fn).result
+
+
+def keyed_semaphore(key: str, limit: int) -> threading.BoundedSemaphore:
+    with _semaphores_lock:
+        semaphore = _semaphores.get(key)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(max(1, limit))
+            _semaphores[key] = semaphore
+        return semaphore
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.waiters = 0
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._flights
+
+    def waiting(self) -> int:
+        with self._lock:
+            return sum(flight.waiters for flight in self._flights.values())
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.calls += 1
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
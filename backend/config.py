@@ -6,11 +6,34 @@ class Settings(BaseSettings):
     openai_assistant_id: Optional[str] = None
     openai_model: str = "gpt-5.2"
     dealcar_api_key: Optional[str] = None
+    dealcar_api_url: str = "https://api.dealcar.io/stock"
+    dealcar_fetch_concurrency: int = 4
+    http_connect_timeout: float = 3.05
+    http_read_timeout: float = 10.0
+    http_pool_connections: int = 8
+    http_pool_maxsize: int = 8
+    http_get_retries: int = 2
+    http_backoff_factor: float = 0.3
     phone_number_id: Optional[str] = None
     token_permanente: Optional[str] = None
     max_history_messages: int = 20
     session_cleanup_days: int = 7
     sessions_file: str = "data/sessions.json"
+    inventory_cache_ttl_seconds: int = 300
+    inventory_refresh_interval_seconds: int = 240
+    inventory_stale_while_revalidate_seconds: int = 900
+    inventory_failure_backoff_seconds: int = 60
+    inventory_snapshot_file: str = "data/inventory_snapshot.bin"
+    search_cache_size: int = 256
+    search_cache_ttl_seconds: int = 600
+    search_cursor_ttl_seconds: int = 1800
+    search_cursor_max_sets: int = 8
+    search_cursor_max_rows: int = 200000
+    compact_tool_outputs: bool = True
+    chat_token_window_ms: int = 40
+    chat_token_max_chars: int = 80
+    tool_call_concurrency: int = 4
+    allow_debug_searches: bool = False
     
     class Config:
         env_file = ".env"
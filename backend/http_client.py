@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+from typing import Any, Dict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    def __init__(self, connect_timeout: float, read_timeout: float, pool_connections: int, pool_maxsize: int, get_retries: int, backoff_factor: float):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._host_stats: Dict[str, Dict[str, Any]] = {}
+
+        retry = Retry(
+            total=get_retries,
+            connect=get_retries,
+            read=get_retries,
+            status=get_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True, max_retries=retry)
+        self.adapter = adapter
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlparse(url).netloc
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self._record(host, time.perf_counter() - started, failed=True)
+            raise
+        self._record(host, time.perf_counter() - started, failed=False)
+        return response
+
+    def _record(self, host: str, elapsed: float, failed: bool):
+        with self._lock:
+            stats = self._host_stats.setdefault(host, {"requests": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stats["requests"] += 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+            if failed:
+                stats["errors"] += 1
+
+    def _connection_counts(self) -> Dict[str, Dict[str, int]]:
+        counts: Dict[str, Dict[str, int]] = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.host}:{pool.port}" if pool.port not in (80, 443, None) else pool.host
+            entry = counts.setdefault(host, {"connections_opened": 0, "pool_requests": 0})
+            entry["connections_opened"] += pool.num_connections
+            entry["pool_requests"] += pool.num_requests
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        connections = self._connection_counts()
+        with self._lock:
+            hosts = {host: dict(values) for host, values in self._host_stats.items()}
+
+        report = {}
+        for host, values in hosts.items():
+            pool = connections.get(host, {"connections_opened": 0, "pool_requests": 0})
+            reused = max(pool["pool_requests"] - pool["connections_opened"], 0)
+            report[host] = {
+                "requests": values["requests"],
+                "errors": values["errors"],
+                "avg_ms": round(values["total_seconds"] / values["requests"] * 1000, 1),
+                "max_ms": round(values["max_seconds"] * 1000, 1),
+                "connections_opened": pool["connections_opened"],
+                "connection_reuse_ratio": round(reused / pool["pool_requests"], 4) if pool["pool_requests"] else 0.0
+            }
+        return report
+
+
+http_client = HttpClient(
+    connect_timeout=settings.http_connect_timeout,
+    read_timeout=settings.http_read_timeout,
+    pool_connections=settings.http_pool_connections,
+    pool_maxsize=settings.http_pool_maxsize,
+    get_retries=settings.http_get_retries,
+    backoff_factor=settings.http_backoff_factor
+)
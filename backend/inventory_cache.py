@@ -0,0 +1,448 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from concurrency import SingleFlight, run_off_hub
+from inventory_columns import InventoryColumns, column_row
+from inventory_index import FilterIndex, VehicleIdIndex
+from name_resolution import NameResolver
+from snapshot_store import load_snapshot, save_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class InventoryFetchError(Exception):
+    pass
+
+
+def content_hash(vehicle: Dict[str, Any]) -> bytes:
+    encoded = json.dumps(vehicle, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+Formatter = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+def _precompute(fn: Optional[Formatter], value: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # A record that cannot be formatted is left for the lookup to format (and fail) on demand.
+    if fn is None or value is None:
+        return None
+    try:
+        return fn(value)
+    except Exception as e:
+        logger.warning(f"[INVENTORY CACHE] Could not precompute display record: {str(e)}")
+        return None
+
+
+class VehicleEntry:
+    __slots__ = ("vehicle_id", "content_hash", "vehicle", "formatted", "viewer", "row")
+
+    def __init__(self, vehicle: Dict[str, Any], digest: bytes, formatter: Formatter, viewer_formatter: Optional[Formatter] = None):
+        vehicle_id = vehicle.get("vehicleId")
+        self.vehicle_id = vehicle_id if isinstance(vehicle_id, str) else None
+        self.content_hash = digest
+        self.vehicle = vehicle
+        self.formatted = _precompute(formatter, vehicle)
+        self.viewer = _precompute(viewer_formatter, self.formatted)
+        self.row = column_row(vehicle)
+
+
+class InventoryChangeSet:
+    def __init__(self, version: int, previous_version: Optional[int], added: List[str], removed: List[str], changed: List[str], unchanged: int, full: bool, duration: float):
+        self.version = version
+        self.previous_version = previous_version
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.unchanged = unchanged
+        self.full = full
+        self.duration = duration
+
+    @property
+    def has_changes(self) -> bool:
+        return self.full or bool(self.added or self.removed or self.changed)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "previous_version": self.previous_version,
+            "full": self.full,
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "changed": len(self.changed),
+            "unchanged": self.unchanged,
+            "sync_ms": round(self.duration * 1000, 2)
+        }
+
+
+# Above this share of rows changed in place (or once rows are added, removed or reordered), columns and indexes
+# are rebuilt from scratch instead of patched.
+PATCH_MAX_FRACTION = 0.1
+
+
+def _patched_positions(entries: List[VehicleEntry], previous: Optional["InventorySnapshot"]) -> Optional[List[int]]:
+    if previous is None or len(entries) != len(previous.entries):
+        return None
+    limit = len(entries) * PATCH_MAX_FRACTION
+    positions = []
+    for position, (entry, old) in enumerate(zip(entries, previous.entries)):
+        if entry is not old:
+            positions.append(position)
+            if len(positions) > limit:
+                return None
+    return positions
+
+
+class InventorySnapshot:
+    def __init__(self, entries: List[VehicleEntry], total_elements: int, total_pages: int, version: int, index: VehicleIdIndex, formatter: Formatter, viewer_formatter: Optional[Formatter] = None, previous: Optional["InventorySnapshot"] = None):
+        self.entries = entries
+        self.vehicles = [entry.vehicle for entry in entries]
+        self.entries_by_id: Dict[str, VehicleEntry] = {}
+        for entry in entries:
+            if entry.vehicle_id is not None:
+                self.entries_by_id.setdefault(entry.vehicle_id, entry)
+        self.total_elements = total_elements
+        self.total_pages = total_pages
+        self.version = version
+        self.index = index
+        rows = [entry.row for entry in entries]
+        positions = _patched_positions(entries, previous)
+        if positions is None:
+            self.columns = InventoryColumns(self.vehicles, rows)
+            self.filter_index = FilterIndex(self.columns)
+            self.names = NameResolver(self.columns)
+        else:
+            # Same rows with a few vehicles changed in place: only the columns (and their indexes) that changed are redone.
+            self.columns = previous.columns.patched(rows, positions)
+            self.filter_index = previous.filter_index.updated(self.columns)
+            same_names = all(self.columns.categorical[name] is previous.columns.categorical[name] for name in ("make", "model"))
+            self.names = previous.names if same_names else NameResolver(self.columns)
+        self.formatter = formatter
+        self.viewer_formatter = viewer_formatter
+        self.fetched_at = time.time()
+        self.source = "live"
+        self.saved_at: Optional[float] = None
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def formatted(self, vehicle: Dict[str, Any]) -> Dict[str, Any]:
+        vehicle_id = vehicle.get("vehicleId")
+        entry = self.entries_by_id.get(vehicle_id) if isinstance(vehicle_id, str) else None
+        if entry is not None and entry.vehicle is vehicle and entry.formatted is not None:
+            return entry.formatted
+        return self.formatter(vehicle)
+
+    def viewer(self, formatted: Dict[str, Any]) -> Dict[str, Any]:
+        vehicle_id = formatted.get("vehicleId")
+        entry = self.entries_by_id.get(vehicle_id) if isinstance(vehicle_id, str) else None
+        if entry is not None and entry.formatted is formatted and entry.viewer is not None:
+            return entry.viewer
+        return self.viewer_formatter(formatted)
+
+
+def build_snapshot(payload: Dict[str, Any], version: int, previous: Optional[InventorySnapshot], formatter: Formatter, viewer_formatter: Optional[Formatter] = None):
+    started = time.perf_counter()
+    vehicles = payload.get("vehicles", [])
+    previous_entries = previous.entries_by_id if previous is not None else {}
+
+    entries = []
+    seen = set()
+    added, changed = [], []
+    upserts: Dict[str, Dict[str, Any]] = {}
+    unchanged = 0
+
+    for vehicle in vehicles:
+        digest = content_hash(vehicle)
+        vehicle_id = vehicle.get("vehicleId")
+        vehicle_id = vehicle_id if isinstance(vehicle_id, str) else None
+        previous_entry = previous_entries.get(vehicle_id) if vehicle_id is not None and vehicle_id not in seen else None
+
+        if previous_entry is not None and previous_entry.content_hash == digest:
+            entries.append(previous_entry)
+            unchanged += 1
+        else:
+            entry = VehicleEntry(vehicle, digest, formatter, viewer_formatter)
+            entries.append(entry)
+            if vehicle_id is not None and vehicle_id not in seen:
+                upserts[vehicle_id] = vehicle
+                (changed if previous_entry is not None else added).append(vehicle_id)
+        if vehicle_id is not None:
+            seen.add(vehicle_id)
+
+    removed = [vehicle_id for vehicle_id in previous_entries if vehicle_id not in seen]
+
+    if previous is None:
+        index = VehicleIdIndex(vehicles)
+    else:
+        index = previous.index.updated(upserts, removed)
+
+    snapshot = InventorySnapshot(
+        entries=entries,
+        total_elements=payload.get("totalElements", 0),
+        total_pages=payload.get("totalPages", 0),
+        version=version,
+        index=index,
+        formatter=formatter,
+        viewer_formatter=viewer_formatter,
+        previous=previous
+    )
+    change_set = InventoryChangeSet(
+        version=version,
+        previous_version=previous.version if previous is not None else None,
+        added=added,
+        removed=removed,
+        changed=changed,
+        unchanged=unchanged,
+        full=previous is None,
+        duration=time.perf_counter() - started
+    )
+    return snapshot, change_set
+
+
+def _spawn_thread(fn: Callable, *args):
+    thread = threading.Thread(target=fn, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+class InventoryCache:
+    def __init__(self, fetch_fn: Callable[[], Optional[Dict[str, Any]]], formatter: Formatter, ttl_seconds: int, refresh_interval_seconds: int, snapshot_path: Optional[str] = None, stale_while_revalidate_seconds: int = 0, key: str = "default", viewer_formatter: Optional[Formatter] = None, failure_backoff_seconds: int = 0):
+        self.fetch_fn = fetch_fn
+        self.formatter = formatter
+        self.viewer_formatter = viewer_formatter
+        self.ttl_seconds = ttl_seconds
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.snapshot_path = snapshot_path
+        self.stale_while_revalidate_seconds = stale_while_revalidate_seconds
+        self.failure_backoff_seconds = failure_backoff_seconds
+        self._failed_at = 0.0
+        self.key = key
+        self._snapshot: Optional[InventorySnapshot] = None
+        self._version = 0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[InventorySnapshot, InventoryChangeSet], None]] = []
+        self._refresher_started = False
+        self._flight = SingleFlight()
+        self._spawn_fn: Callable = _spawn_thread
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.last_fetch_seconds = 0.0
+        self.saved_seconds = 0.0
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+        self.last_full_sync_seconds = 0.0
+        self.last_incremental_sync_seconds = 0.0
+        self.last_change_set: Optional[InventoryChangeSet] = None
+        self.stale_served = 0
+        self.snapshot_bytes = 0
+        self.revalidations = 0
+        self.warmups = 0
+
+    def subscribe(self, listener: Callable[[InventorySnapshot, InventoryChangeSet], None]):
+        self._listeners.append(listener)
+
+    def peek(self) -> Optional[InventorySnapshot]:
+        return self._snapshot
+
+    def get_snapshot(self) -> InventorySnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.age < self.ttl_seconds:
+            with self._lock:
+                self.hits += 1
+                self.saved_seconds += self.last_fetch_seconds
+            return snapshot
+
+        if snapshot is not None and snapshot.age < self.ttl_seconds + self.stale_while_revalidate_seconds:
+            with self._lock:
+                self.stale_served += 1
+            self.refresh_async()
+            return snapshot
+
+        if snapshot is not None and time.time() - self._failed_at < self.failure_backoff_seconds:
+            # Dealcar just failed: waiting on another fetch (timeouts, retries) would only delay the same stale answer.
+            with self._lock:
+                self.stale_served += 1
+            self.refresh_async()
+            return snapshot
+
+        with self._lock:
+            self.misses += 1
+        logger.info(f"[INVENTORY CACHE] Miss - snapshot {'expired' if snapshot else 'empty'}, fetching")
+        try:
+            return self.refresh()
+        except InventoryFetchError:
+            if snapshot is None:
+                raise
+            with self._lock:
+                self.stale_served += 1
+            logger.warning(f"[INVENTORY CACHE] Serving stale snapshot v{snapshot.version} ({snapshot.age:.0f}s old) after failed refresh")
+            return snapshot
+
+    def load_from_disk(self) -> Optional[InventorySnapshot]:
+        if not self.snapshot_path or self._snapshot is not None:
+            return self._snapshot
+        loaded = load_snapshot(self.snapshot_path)
+        if loaded is None:
+            return None
+
+        payload, saved_at = loaded
+        snapshot = self._apply(payload, 0.0, persist=False)
+        snapshot.source = "disk"
+        snapshot.saved_at = saved_at
+        # Age counts from when the data was fetched, not from this restart, so TTL and stale-while-revalidate apply to it.
+        snapshot.fetched_at = saved_at
+        return snapshot
+
+    def refresh(self) -> InventorySnapshot:
+        return self._flight.do(self.key, self._fetch_and_apply)
+
+    def refresh_async(self) -> bool:
+        if self._flight.in_flight(self.key):
+            return False
+        with self._lock:
+            self.revalidations += 1
+        logger.info(f"[INVENTORY CACHE] Revalidating snapshot in background")
+        self._spawn_fn(self._refresh_quietly)
+        return True
+
+    def warm_up(self) -> bool:
+        # A search is known to be coming: start the fetch now so the search coalesces onto it instead of starting it.
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.age < self.ttl_seconds:
+            return False
+        with self._lock:
+            self.warmups += 1
+        return self.refresh_async()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"[INVENTORY CACHE] Background revalidation error: {str(e)}")
+
+    def _fetch_and_apply(self) -> InventorySnapshot:
+        started = time.perf_counter()
+        payload = self.fetch_fn()
+        elapsed = time.perf_counter() - started
+
+        if not payload or "error" in payload:
+            with self._lock:
+                self.refresh_failures += 1
+                self._failed_at = time.time()
+            error = payload.get("error") if payload else "Empty inventory response"
+            logger.error(f"[INVENTORY CACHE] Refresh failed after {elapsed * 1000:.0f}ms: {error}")
+            raise InventoryFetchError(error)
+
+        self._failed_at = 0.0
+        return self._apply(payload, elapsed)
+
+    def _apply(self, payload: Dict[str, Any], fetch_seconds: float, persist: bool = True) -> InventorySnapshot:
+        previous = self._snapshot
+        snapshot, change_set = run_off_hub(build_snapshot, payload, self._version + 1, previous, self.formatter, self.viewer_formatter)
+
+        unchanged = (
+            previous is not None
+            and not change_set.has_changes
+            and snapshot.total_elements == previous.total_elements
+            and len(snapshot.entries) == len(previous.entries)
+            and all(current is old for current, old in zip(snapshot.entries, previous.entries))
+        )
+        if unchanged:
+            previous.fetched_at = time.time()
+            snapshot = previous
+            change_set.version = previous.version
+
+        with self._lock:
+            if snapshot is not previous:
+                self._version = snapshot.version
+                self._snapshot = snapshot
+            self.refreshes += 1
+            self.last_fetch_seconds = fetch_seconds
+            self.last_change_set = change_set
+            if change_set.full:
+                self.full_syncs += 1
+                self.last_full_sync_seconds = change_set.duration
+            else:
+                self.incremental_syncs += 1
+                self.last_incremental_sync_seconds = change_set.duration
+
+        logger.info(
+            f"[INVENTORY CACHE] Snapshot v{snapshot.version} ready: {len(snapshot.vehicles)} vehicles, "
+            f"fetch {fetch_seconds * 1000:.0f}ms, {'full' if change_set.full else 'incremental'} sync {change_set.duration * 1000:.1f}ms "
+            f"(+{len(change_set.added)} -{len(change_set.removed)} ~{len(change_set.changed)})"
+        )
+
+        if persist and self.snapshot_path and snapshot is not previous:
+            self._persist(snapshot)
+
+        if snapshot is not previous:
+            for listener in self._listeners:
+                try:
+                    listener(snapshot, change_set)
+                except Exception as e:
+                    logger.error(f"[INVENTORY CACHE] Change listener error: {str(e)}")
+        return snapshot
+
+    def _persist(self, snapshot: InventorySnapshot):
+        try:
+            self.snapshot_bytes = save_snapshot(self.snapshot_path, {
+                "vehicles": snapshot.vehicles,
+                "totalElements": snapshot.total_elements,
+                "totalPages": snapshot.total_pages
+            })
+        except (OSError, ValueError) as e:
+            logger.error(f"[INVENTORY CACHE] Could not persist snapshot: {str(e)}")
+
+    def start_background_refresh(self, spawn_fn: Optional[Callable] = None, sleep_fn: Optional[Callable[[float], Any]] = None):
+        if spawn_fn is not None:
+            self._spawn_fn = spawn_fn
+        if self.refresh_interval_seconds <= 0 or self._refresher_started:
+            return
+        self._refresher_started = True
+        logger.info(f"[INVENTORY CACHE] Background refresh every {self.refresh_interval_seconds}s")
+        self._spawn_fn(self._refresh_loop, sleep_fn or time.sleep)
+
+    def _refresh_loop(self, sleep_fn: Callable[[float], Any]):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"[INVENTORY CACHE] Background refresh error: {str(e)}")
+            sleep_fn(self.refresh_interval_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "version": snapshot.version if snapshot else None,
+            "vehicles": len(snapshot.vehicles) if snapshot else 0,
+            "age_seconds": round(snapshot.age, 1) if snapshot else None,
+            "source": snapshot.source if snapshot else None,
+            "stale_served": self.stale_served,
+            "revalidations": self.revalidations,
+            "warmups": self.warmups,
+            "fetches_started": self._flight.calls,
+            "coalesced_waiters": self._flight.coalesced,
+            "waiting_now": self._flight.waiting(),
+            "snapshot_bytes": self.snapshot_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "last_fetch_ms": round(self.last_fetch_seconds * 1000, 1),
+            "saved_seconds": round(self.saved_seconds, 2),
+            "full_syncs": self.full_syncs,
+            "incremental_syncs": self.incremental_syncs,
+            "last_full_sync_ms": round(self.last_full_sync_seconds * 1000, 2),
+            "last_incremental_sync_ms": round(self.last_incremental_sync_seconds * 1000, 2),
+            "last_change_set": self.last_change_set.summary() if self.last_change_set else None
+        }
@@ -0,0 +1,209 @@
+from collections import abc
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+NUMERIC_COLUMNS = {
+    "price": float,
+    "year": int,
+    "kilometers": float,
+    "power": int,
+    "cc": int,
+    "seats": int,
+    "doors": int
+}
+NUMERIC_KEYS = {
+    "year": "registrationYear",
+    "kilometers": "kilometers",
+    "power": "power",
+    "cc": "cc",
+    "seats": "seats",
+    "doors": "doors"
+}
+CATEGORICAL_COLUMNS = {
+    "make": "make",
+    "model": "model",
+    "version": "version",
+    "fuel": "fuel",
+    "transmission": "transmission",
+    "body_style": "bodyStyle",
+    "color": "color",
+    "ecological_label": "ecologicalLabel"
+}
+
+
+# Stands in for list/dict field values so that every string predicate on them fails,
+# which is how the per-dict filter treated them.
+class Unhashable:
+    pass
+
+
+UNHASHABLE = Unhashable()
+
+
+def _coerce_number(value: Any, cast: Callable[[str], Any]) -> Any:
+    if isinstance(value, str):
+        try:
+            return cast(value)
+        except (ValueError, TypeError):
+            return 0
+    return value
+
+
+def numeric_value(value: Any, cast: Callable[[str], Any]) -> Optional[float]:
+    value = _coerce_number(value, cast)
+    if not isinstance(value, (int, float)):
+        return None
+    try:
+        return float(value)
+    except OverflowError:
+        return np.inf if value > 0 else -np.inf
+
+
+def categorical_value(value: Any) -> Hashable:
+    if type(value) is str or isinstance(value, abc.Hashable):
+        return value
+    return UNHASHABLE
+
+
+# Everything the columns need from one vehicle: (readable, numeric values, categorical values).
+# Computed once per vehicle version and kept on the snapshot entry, so a refresh only re-extracts what changed.
+ColumnRow = Tuple[bool, Tuple[Optional[float], ...], Tuple[Hashable, ...]]
+
+
+def column_row(vehicle: Any) -> ColumnRow:
+    valid = True
+    if not isinstance(vehicle, dict):
+        valid = False
+        vehicle = {}
+    vehicle_id = vehicle.get("vehicleId", "N/A")
+    pricing = vehicle.get("pricing", {})
+    if not isinstance(vehicle_id, (str, list, tuple)) or not isinstance(pricing, dict):
+        valid = False
+        pricing = {}
+
+    numbers = [numeric_value(pricing.get("price", 0), NUMERIC_COLUMNS["price"])]
+    numbers += [numeric_value(vehicle.get(key, 0), NUMERIC_COLUMNS[name]) for name, key in NUMERIC_KEYS.items()]
+    categories = tuple(categorical_value(vehicle.get(key, "")) for key in CATEGORICAL_COLUMNS.values())
+    return valid, tuple(numbers), categories
+
+
+NUMERIC_ORDER = ["price"] + list(NUMERIC_KEYS)
+
+
+def _category_key(value: Hashable) -> Hashable:
+    # True, 1 and 1.0 hash alike, so non-strings are keyed with their type.
+    return value if type(value) is str else (type(value), value)
+
+
+class NumericColumn:
+    def __init__(self, values: Sequence[Optional[float]]):
+        size = len(values)
+        self.valid = np.fromiter((value is not None for value in values), dtype=bool, count=size)
+        self.values = np.fromiter((0.0 if value is None else value for value in values), dtype=np.float64, count=size)
+
+    def patched(self, positions: List[int], values: Sequence[Optional[float]]) -> "NumericColumn":
+        # Returns self when the rows at positions already hold these values, so indexes built on it can be kept.
+        valid = np.array([value is not None for value in values], dtype=bool)
+        numbers = np.array([0.0 if value is None else value for value in values], dtype=np.float64)
+        if np.array_equal(self.valid[positions], valid) and np.array_equal(self.values[positions], numbers, equal_nan=True):
+            return self
+        column = NumericColumn.__new__(NumericColumn)
+        column.valid = self.valid.copy()
+        column.valid[positions] = valid
+        column.values = self.values.copy()
+        column.values[positions] = numbers
+        return column
+
+    def at_most(self, bound: float) -> np.ndarray:
+        return self.valid & ~(self.values > bound)
+
+    def at_least(self, bound: float) -> np.ndarray:
+        return self.valid & ~(self.values < bound)
+
+
+class CategoricalColumn:
+    def __init__(self, values: Sequence[Hashable]):
+        lookup: Dict[Hashable, int] = {}
+        codes = [lookup.setdefault(_category_key(value), len(lookup)) for value in values]
+        self.lookup = lookup
+        self.categories: List[Hashable] = [key if type(key) is str else key[1] for key in lookup]
+        self.codes = np.array(codes, dtype=np.int32)
+        self.counts = np.bincount(self.codes, minlength=len(self.categories))
+
+    def patched(self, positions: List[int], values: Sequence[Hashable]) -> Optional["CategoricalColumn"]:
+        # Re-codes only the rows at positions; self when nothing changes, and the categories list is shared unless a
+        # new value appears. None when a category would be left without rows: the caller rebuilds the column instead.
+        keys = [_category_key(value) for value in values]
+        if all(self.lookup.get(key) == code for key, code in zip(keys, self.codes[positions].tolist())):
+            return self
+        column = CategoricalColumn.__new__(CategoricalColumn)
+        column.lookup = self.lookup
+        column.categories = self.categories
+        for key, value in zip(keys, values):
+            if key not in column.lookup:
+                if column.lookup is self.lookup:
+                    column.lookup, column.categories = dict(self.lookup), list(self.categories)
+                column.lookup[key] = len(column.categories)
+                column.categories.append(value)
+        column.codes = self.codes.copy()
+        column.codes[positions] = [column.lookup[key] for key in keys]
+        column.counts = np.bincount(column.codes, minlength=len(column.categories))
+        if not column.counts.all():
+            return None
+        return column
+
+    def category_mask(self, predicate: Callable[[Any], bool]) -> np.ndarray:
+        table = np.zeros(len(self.categories), dtype=bool)
+        for code, value in enumerate(self.categories):
+            try:
+                table[code] = bool(predicate(value))
+            except Exception:
+                table[code] = False
+        return table
+
+    def mask(self, predicate: Callable[[Any], bool]) -> np.ndarray:
+        return self.category_mask(predicate)[self.codes]
+
+
+class InventoryColumns:
+    def __init__(self, vehicles: List[Dict[str, Any]], rows: Optional[List[ColumnRow]] = None):
+        if rows is None:
+            rows = [column_row(vehicle) for vehicle in vehicles]
+        self.size = len(rows)
+        self.row_valid = np.array([row[0] for row in rows], dtype=bool)
+        self.numeric = {
+            name: NumericColumn([row[1][position] for row in rows])
+            for position, name in enumerate(NUMERIC_ORDER)
+        }
+        self.categorical = {
+            name: CategoricalColumn([row[2][position] for row in rows])
+            for position, name in enumerate(CATEGORICAL_COLUMNS)
+        }
+
+    def patched(self, rows: List[ColumnRow], positions: List[int]) -> "InventoryColumns":
+        # Columns for the same rows with only those at positions replaced; every column whose values did not change
+        # is kept as the same object, which is what lets FilterIndex.updated() and the name resolver be reused.
+        changed = [rows[position] for position in positions]
+        columns = InventoryColumns.__new__(InventoryColumns)
+        columns.size = self.size
+        row_valid = np.array([row[0] for row in changed], dtype=bool)
+        if np.array_equal(self.row_valid[positions], row_valid):
+            columns.row_valid = self.row_valid
+        else:
+            columns.row_valid = self.row_valid.copy()
+            columns.row_valid[positions] = row_valid
+        columns.numeric = {
+            name: self.numeric[name].patched(positions, [row[1][position] for row in changed])
+            for position, name in enumerate(NUMERIC_ORDER)
+        }
+        columns.categorical = {}
+        for position, name in enumerate(CATEGORICAL_COLUMNS):
+            column = self.categorical[name].patched(positions, [row[2][position] for row in changed])
+            if column is None:
+                column = CategoricalColumn([row[2][position] for row in rows])
+            columns.categorical[name] = column
+        return columns
+
+    def __len__(self) -> int:
+        return self.size
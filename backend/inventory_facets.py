@@ -0,0 +1,79 @@
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from inventory_columns import CategoricalColumn, InventoryColumns, NumericColumn
+from inventory_filter import normalize_make
+
+FACET_COLUMNS = {
+    "make": "make",
+    "fuel": "fuel",
+    "bodyStyle": "body_style",
+    "transmission": "transmission"
+}
+FACET_LIMIT = 12
+PRICE_BANDS = [10000, 15000, 20000, 25000, 30000, 40000, 60000]
+YEAR_BANDS = [2010, 2015, 2018, 2020, 2022, 2024]
+
+
+# Price bands include their upper edge so that a max_price of 20000 lands in "15000-20000";
+# year bands include their lower edge so that "2018-2019" means those two registration years.
+def band_labels(edges: List[int], upper_inclusive: bool) -> List[str]:
+    if upper_inclusive:
+        return [f"<={edges[0]}"] + [f"{low}-{high}" for low, high in zip(edges, edges[1:])] + [f">{edges[-1]}"]
+    return [f"<{edges[0]}"] + [f"{low}-{high - 1}" for low, high in zip(edges, edges[1:])] + [f"{edges[-1]}+"]
+
+
+PRICE_LABELS = band_labels(PRICE_BANDS, upper_inclusive=True)
+YEAR_LABELS = band_labels(YEAR_BANDS, upper_inclusive=False)
+
+
+def make_key(column: CategoricalColumn) -> Callable[[str], str]:
+    # A make filter matches every make whose normalized name contains it, so "Mercedes-Benz" is counted under
+    # MERCEDES when that is stocked too: each bucket then holds exactly what filtering on its name returns.
+    makes = sorted({normalize_make(value) for value in column.categories if isinstance(value, str) and normalize_make(value)}, key=len)
+
+    def key(value: str) -> str:
+        normalized = normalize_make(value)
+        return next((make for make in makes if make in normalized), normalized)
+    return key
+
+
+# Spellings the filter treats as one value share a bucket.
+FACET_KEYS: Dict[str, Callable[[CategoricalColumn], Callable[[str], str]]] = {
+    "make": make_key
+}
+
+
+def category_counts(column: CategoricalColumn, rows: np.ndarray, everything: bool, key_fn: Optional[Callable[[str], str]] = None) -> Dict[str, int]:
+    counts = column.counts if everything else np.bincount(column.codes[rows], minlength=len(column.categories))
+    totals: Dict[str, int] = {}
+    for code, value in enumerate(column.categories):
+        if counts[code] and isinstance(value, str) and value:
+            key = key_fn(value) if key_fn is not None else value
+            totals[key] = totals.get(key, 0) + int(counts[code])
+    ranked = sorted(((count, value) for value, count in totals.items()), key=lambda item: (-item[0], item[1]))
+    return {value: count for count, value in ranked[:FACET_LIMIT]}
+
+
+def band_counts(column: NumericColumn, rows: np.ndarray, edges: List[int], labels: List[str], upper_inclusive: bool) -> Dict[str, int]:
+    values = column.values[rows]
+    values = values[column.valid[rows] & np.isfinite(values)]
+    counts = np.bincount(np.searchsorted(edges, values, side="left" if upper_inclusive else "right"), minlength=len(labels))
+    return {label: int(count) for label, count in zip(labels, counts) if count}
+
+
+def facet_counts(columns: InventoryColumns, rows: List[int]) -> Dict[str, Any]:
+    candidates = np.asarray(rows, dtype=np.intp)
+    # An unfiltered search covers every readable row, so the per-category totals kept on the columns already answer it.
+    everything = len(candidates) == len(columns) and bool(columns.row_valid.all())
+    facets = {
+        name: category_counts(
+            columns.categorical[column], candidates, everything,
+            FACET_KEYS[column](columns.categorical[column]) if column in FACET_KEYS else None
+        )
+        for name, column in FACET_COLUMNS.items()
+    }
+    facets["price"] = band_counts(columns.numeric["price"], candidates, PRICE_BANDS, PRICE_LABELS, upper_inclusive=True)
+    facets["year"] = band_counts(columns.numeric["year"], candidates, YEAR_BANDS, YEAR_LABELS, upper_inclusive=False)
+    return facets
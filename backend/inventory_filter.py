@@ -0,0 +1,211 @@
+import json
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from inventory_columns import InventoryColumns
+
+FAMILY_CAR_STYLES = ["MONOVOLUMEN", "FAMILIAR", "CUATRO_POR_CUATRO_SUV", "SUV5P", "4X4"]
+
+RANGE_FILTERS = [
+    ("max_price", "price", "at_most"),
+    ("min_price", "price", "at_least"),
+    ("year_min", "year", "at_least"),
+    ("year_max", "year", "at_most"),
+    ("min_kilometers", "kilometers", "at_least"),
+    ("max_kilometers", "kilometers", "at_most"),
+    ("min_seats", "seats", "at_least"),
+    ("max_seats", "seats", "at_most"),
+    ("min_doors", "doors", "at_least"),
+    ("max_doors", "doors", "at_most"),
+    ("min_power", "power", "at_least"),
+    ("max_power", "power", "at_most"),
+    ("min_cc", "cc", "at_least"),
+    ("max_cc", "cc", "at_most")
+]
+
+
+def normalize_make(make: str) -> str:
+    return make.upper().replace("_", " ").replace("-", " ").strip()
+
+
+def normalize_transmission(transmission: str) -> str:
+    trans_upper = transmission.upper()
+    if trans_upper in ["MANUAL", "M"]:
+        return "M"
+    elif trans_upper in ["AUTOMATIC", "AUTO", "A"]:
+        return "A"
+    return transmission
+
+
+def normalize_ecological_label(label: str) -> str:
+    label_upper = label.upper().strip()
+
+    if label_upper in ["0", "CERO", "ZERO"]:
+        return "0"
+    elif label_upper in ["ECO"]:
+        return "ECO"
+    elif label_upper in ["C"]:
+        return "C"
+    elif label_upper in ["B"]:
+        return "B"
+
+    return label_upper
+
+
+def make_matches(vehicle_make: str, make_filter: Any) -> bool:
+    vehicle_make_normalized = normalize_make(vehicle_make)
+    if isinstance(make_filter, list):
+        normalized_filters = [normalize_make(m) for m in make_filter if m]
+        return any(vehicle_make_normalized == nf or nf in vehicle_make_normalized for nf in normalized_filters)
+    make_filter_normalized = normalize_make(make_filter)
+    return vehicle_make_normalized == make_filter_normalized or make_filter_normalized in vehicle_make_normalized
+
+
+def model_term_matches(vehicle_model: str, term: str) -> bool:
+    vehicle_model_lower = vehicle_model.lower()
+    vehicle_model_words = set(vehicle_model_lower.replace("-", " ").split())
+    m_lower = term.lower()
+    if len(m_lower) <= 2:
+        return m_lower in vehicle_model_words
+    return m_lower in vehicle_model_lower or any(word.startswith(m_lower) or m_lower in word for word in vehicle_model_words)
+
+
+def model_matches(vehicle_model: str, model_filter: Any) -> bool:
+    if isinstance(model_filter, list):
+        for m in model_filter:
+            if m and model_term_matches(vehicle_model, m):
+                return True
+        return False
+    return model_term_matches(vehicle_model, model_filter)
+
+
+def body_style_matches(vehicle_style: str, requested_style: str) -> bool:
+    requested_style = requested_style.upper()
+    vehicle_style = vehicle_style.upper()
+    if requested_style in FAMILY_CAR_STYLES:
+        return vehicle_style in FAMILY_CAR_STYLES
+    return vehicle_style == requested_style
+
+
+def ecological_label_matches(vehicle_label: str, requested_label: str) -> bool:
+    if not vehicle_label:
+        return False
+    return normalize_ecological_label(vehicle_label) == normalize_ecological_label(requested_label)
+
+
+def categorical_predicates(filters: Dict[str, Any]) -> List[Tuple[str, Callable[[Any], bool]]]:
+    predicates = []
+    if filters.get("make"):
+        predicates.append(("make", lambda value, wanted=filters["make"]: make_matches(value, wanted)))
+    if filters.get("model"):
+        predicates.append(("model", lambda value, wanted=filters["model"]: model_matches(value, wanted)))
+    if filters.get("version"):
+        predicates.append(("version", lambda value, wanted=filters["version"]: wanted.lower() in value.lower()))
+    if filters.get("fuel"):
+        predicates.append(("fuel", lambda value, wanted=filters["fuel"]: value.upper() == wanted.upper()))
+    if filters.get("transmission"):
+        predicates.append(("transmission", lambda value, wanted=filters["transmission"]: value.upper() == normalize_transmission(wanted)))
+    if filters.get("body_style"):
+        predicates.append(("body_style", lambda value, wanted=filters["body_style"]: body_style_matches(value, wanted)))
+    if filters.get("color"):
+        predicates.append(("color", lambda value, wanted=filters["color"]: wanted.lower() in value.lower()))
+    if filters.get("ecological_label"):
+        predicates.append(("ecological_label", lambda value, wanted=filters["ecological_label"]: ecological_label_matches(value, wanted)))
+    return predicates
+
+
+def filter_masks(columns: InventoryColumns, filters: Dict[str, Any]) -> List[Tuple[str, np.ndarray]]:
+    masks = [(name, columns.categorical[name].mask(predicate)) for name, predicate in categorical_predicates(filters)]
+
+    for key, column, bound_kind in RANGE_FILTERS:
+        bound = filters.get(key)
+        if not bound:
+            continue
+        if not isinstance(bound, (int, float)):
+            masks.append((key, np.zeros(len(columns), dtype=bool)))
+            continue
+        masks.append((key, getattr(columns.numeric[column], bound_kind)(bound)))
+
+    return masks
+
+
+def filter_mask(columns: InventoryColumns, filters: Dict[str, Any]) -> np.ndarray:
+    mask = columns.row_valid.copy()
+    for _, predicate_mask in filter_masks(columns, filters):
+        mask &= predicate_mask
+    return mask
+
+
+def filter_rows(columns: InventoryColumns, filters: Dict[str, Any]) -> List[int]:
+    return np.flatnonzero(filter_mask(columns, filters)).tolist()
+
+
+class FilterDiagnostics:
+    def __init__(self, columns: InventoryColumns, filters: Dict[str, Any]):
+        self.masks = filter_masks(columns, filters)
+        if not columns.row_valid.all():
+            self.masks.insert(0, ("unreadable", columns.row_valid))
+        self.total = len(columns)
+        failures = np.zeros(self.total, dtype=np.int32)
+        for _, mask in self.masks:
+            failures += ~mask
+        self.passed = int((failures == 0).sum())
+        self.histogram = {
+            name: {"rejected": int((~mask).sum()), "only": int((~mask & (failures == 1)).sum())}
+            for name, mask in self.masks
+        }
+
+    def summary(self) -> str:
+        rejected = ", ".join(f"{name}={counts['rejected']}/{counts['only']}" for name, counts in self.histogram.items())
+        return f"{self.passed}/{self.total} passed" + (f"; rejected (total/only) {rejected}" if rejected else "")
+
+    def failed_filters(self, row: int) -> List[str]:
+        return [name for name, mask in self.masks if not mask[row]]
+
+
+def _raw(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def _canonical_terms(value: Any, normalize: Callable[[str], str]) -> Any:
+    terms = value if isinstance(value, list) else [value]
+    if any(term and not isinstance(term, str) for term in terms):
+        return _raw(value)
+    return tuple(sorted({normalize(term) for term in terms if term}))
+
+
+def _canonical_text(value: Any, normalize: Callable[[str], str]) -> Any:
+    return normalize(value) if isinstance(value, str) else _raw(value)
+
+
+def _canonical_body_style(value: str) -> str:
+    value = value.upper()
+    return "FAMILY" if value in FAMILY_CAR_STYLES else value
+
+
+CANONICAL_FILTERS = {
+    "make": lambda value: _canonical_terms(value, normalize_make),
+    "model": lambda value: _canonical_terms(value, str.lower),
+    "version": lambda value: _canonical_text(value, str.lower),
+    "color": lambda value: _canonical_text(value, str.lower),
+    "fuel": lambda value: _canonical_text(value, str.upper),
+    "transmission": lambda value: _canonical_text(value, normalize_transmission),
+    "body_style": lambda value: _canonical_text(value, _canonical_body_style),
+    "ecological_label": lambda value: _canonical_text(value, normalize_ecological_label)
+}
+RANGE_KEYS = {key for key, _, _ in RANGE_FILTERS}
+
+
+def canonical_filters(filters: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    canonical = []
+    for key, value in filters.items():
+        if not value:
+            continue
+        if key in CANONICAL_FILTERS:
+            canonical.append((key, CANONICAL_FILTERS[key](value)))
+        elif key in RANGE_KEYS and isinstance(value, (int, float)):
+            canonical.append((key, float(value)))
+        else:
+            canonical.append((key, _raw(value)))
+    return tuple(sorted(canonical))
@@ -0,0 +1,208 @@
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from inventory_columns import CategoricalColumn, InventoryColumns, NumericColumn
+from inventory_filter import FAMILY_CAR_STYLES, normalize_ecological_label, normalize_make
+
+_EMPTY_ROWS = np.empty(0, dtype=np.intp)
+
+POSTING_KEYS = {
+    "make": normalize_make,
+    "fuel": lambda value: value.upper(),
+    "transmission": lambda value: value.upper(),
+    "body_style": lambda value: value.upper(),
+    "color": lambda value: value.lower(),
+    "ecological_label": lambda value: normalize_ecological_label(value) if value else None
+}
+
+
+class VehicleIdIndex:
+    def __init__(self, vehicles: List[Dict[str, Any]]):
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        for vehicle in vehicles:
+            vehicle_id = vehicle.get("vehicleId")
+            if isinstance(vehicle_id, str) and vehicle_id not in self.by_id:
+                self.by_id[vehicle_id] = vehicle
+        self.sorted_ids = sorted(self.by_id)
+
+    def updated(self, upserts: Dict[str, Dict[str, Any]], removed: Iterable[str]) -> "VehicleIdIndex":
+        index = VehicleIdIndex.__new__(VehicleIdIndex)
+        removed = set(removed)
+        index.by_id = dict(self.by_id)
+        for vehicle_id in removed:
+            index.by_id.pop(vehicle_id, None)
+        added = [vehicle_id for vehicle_id in upserts if vehicle_id not in index.by_id]
+        index.by_id.update(upserts)
+
+        if not removed and not added:
+            index.sorted_ids = self.sorted_ids
+        elif len(added) > 64:
+            index.sorted_ids = sorted(index.by_id)
+        else:
+            index.sorted_ids = [vehicle_id for vehicle_id in self.sorted_ids if vehicle_id not in removed] if removed else list(self.sorted_ids)
+            for vehicle_id in added:
+                insort(index.sorted_ids, vehicle_id)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, vehicle_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(vehicle_id)
+
+    def prefix_ids(self, prefix: str) -> List[str]:
+        matches = []
+        position = bisect_left(self.sorted_ids, prefix)
+        while position < len(self.sorted_ids) and self.sorted_ids[position].startswith(prefix):
+            matches.append(self.sorted_ids[position])
+            position += 1
+        return matches
+
+
+class CategoryPostings:
+    def __init__(self, column: CategoricalColumn, row_valid: np.ndarray, key_fn: Callable[[Any], Any]):
+        keys: List[Any] = []
+        for value in column.categories:
+            try:
+                keys.append(key_fn(value))
+            except Exception:
+                keys.append(None)
+        self.category_keys = keys
+        self.codes = column.codes
+
+        self.postings: Dict[Any, np.ndarray] = {}
+        order = np.argsort(column.codes, kind="stable")
+        boundaries = np.searchsorted(column.codes[order], np.arange(len(column.categories) + 1))
+        rows_by_key: Dict[Any, List[np.ndarray]] = {}
+        for code, key in enumerate(keys):
+            if key is None:
+                continue
+            rows = order[boundaries[code]:boundaries[code + 1]]
+            rows_by_key.setdefault(key, []).append(rows[row_valid[rows]])
+        for key, parts in rows_by_key.items():
+            self.postings[key] = np.sort(np.concatenate(parts)) if len(parts) > 1 else parts[0]
+
+    def keys(self) -> List[Any]:
+        return list(self.postings)
+
+    def get(self, key: Any) -> np.ndarray:
+        return self.postings.get(key, _EMPTY_ROWS)
+
+    def union(self, keys: Iterable[Any]) -> np.ndarray:
+        parts = [self.postings[key] for key in keys if key in self.postings]
+        if not parts:
+            return _EMPTY_ROWS
+        return np.sort(np.concatenate(parts)) if len(parts) > 1 else parts[0]
+
+
+    def probe(self, candidates: np.ndarray, keys: Iterable[Any]) -> np.ndarray:
+        wanted = set(keys)
+        table = np.fromiter((key is not None and key in wanted for key in self.category_keys), dtype=bool, count=len(self.category_keys))
+        return candidates[table[self.codes[candidates]]]
+
+
+class SortedColumn:
+    def __init__(self, column: NumericColumn, row_valid: np.ndarray):
+        self.column = column
+        valid = column.valid & row_valid
+        is_nan = np.isnan(column.values)
+        comparable = np.flatnonzero(valid & ~is_nan)
+        self.order = comparable[np.argsort(column.values[comparable], kind="stable")]
+        self.sorted_values = column.values[self.order]
+        # NaN compares false against every bound, so those rows pass any range.
+        self.nan_rows = np.flatnonzero(valid & is_nan)
+
+    def _bounds(self, low: Optional[float], high: Optional[float]) -> Tuple[int, int]:
+        start = int(np.searchsorted(self.sorted_values, low, side="left")) if low is not None else 0
+        end = int(np.searchsorted(self.sorted_values, high, side="right")) if high is not None else len(self.sorted_values)
+        return start, max(start, end)
+
+    def count(self, low: Optional[float], high: Optional[float]) -> int:
+        start, end = self._bounds(low, high)
+        return end - start + len(self.nan_rows)
+
+    def rows(self, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        start, end = self._bounds(low, high)
+        return np.sort(np.concatenate((self.order[start:end], self.nan_rows)))
+
+
+class ModelTokenIndex:
+    def __init__(self, column: CategoricalColumn):
+        self.size = len(column.categories)
+        self.lowered: List[Optional[str]] = []
+        words: Dict[str, List[int]] = {}
+        grams: Dict[str, List[int]] = {}
+        for code, value in enumerate(column.categories):
+            if not isinstance(value, str):
+                self.lowered.append(None)
+                continue
+            lowered = value.lower()
+            self.lowered.append(lowered)
+            for word in set(lowered.replace("-", " ").split()):
+                words.setdefault(word, []).append(code)
+            for gram in {lowered[i:i + 3] for i in range(len(lowered) - 2)}:
+                grams.setdefault(gram, []).append(code)
+        self.words = {word: np.array(codes, dtype=np.intp) for word, codes in words.items()}
+        self.grams = {gram: np.array(codes, dtype=np.intp) for gram, codes in grams.items()}
+
+    def term_codes(self, term: str) -> np.ndarray:
+        m_lower = term.lower()
+        if len(m_lower) <= 2:
+            return self.words.get(m_lower, _EMPTY_ROWS)
+
+        postings = sorted((self.grams.get(m_lower[i:i + 3], _EMPTY_ROWS) for i in range(len(m_lower) - 2)), key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            if not len(candidates):
+                break
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+        return np.array([code for code in candidates if m_lower in self.lowered[code]], dtype=np.intp)
+
+    def category_table(self, model_filter: Any) -> np.ndarray:
+        table = np.zeros(self.size, dtype=bool)
+        for term in model_filter if isinstance(model_filter, list) else [model_filter]:
+            if not term:
+                continue
+            if not isinstance(term, str):
+                # The row-wise filter raised on this term, rejecting every model not matched before it.
+                break
+            table[self.term_codes(term)] = True
+        return table
+
+
+class FilterIndex:
+    def __init__(self, columns: InventoryColumns):
+        self.columns = columns
+        row_valid = columns.row_valid
+        self.postings = {
+            name: CategoryPostings(columns.categorical[name], row_valid, key_fn)
+            for name, key_fn in POSTING_KEYS.items()
+        }
+        self.groups = {"family": [style for style in FAMILY_CAR_STYLES if style in self.postings["body_style"].postings]}
+        self.ranges = {name: SortedColumn(column, row_valid) for name, column in columns.numeric.items()}
+        self.models = ModelTokenIndex(columns.categorical["model"])
+        self.all_rows = np.flatnonzero(row_valid)
+
+    def updated(self, columns: InventoryColumns) -> "FilterIndex":
+        # For columns from InventoryColumns.patched(): only the postings and ranges of columns that changed are rebuilt.
+        previous = self.columns
+        if columns.row_valid is not previous.row_valid:
+            return FilterIndex(columns)
+        index = FilterIndex.__new__(FilterIndex)
+        index.columns = columns
+        index.postings = {
+            name: postings if columns.categorical[name] is previous.categorical[name]
+            else CategoryPostings(columns.categorical[name], columns.row_valid, POSTING_KEYS[name])
+            for name, postings in self.postings.items()
+        }
+        index.groups = {"family": [style for style in FAMILY_CAR_STYLES if style in index.postings["body_style"].postings]}
+        index.ranges = {
+            name: ranges if columns.numeric[name] is previous.numeric[name] else SortedColumn(columns.numeric[name], columns.row_valid)
+            for name, ranges in self.ranges.items()
+        }
+        same_models = columns.categorical["model"].categories is previous.categorical["model"].categories
+        index.models = self.models if same_models else ModelTokenIndex(columns.categorical["model"])
+        index.all_rows = self.all_rows
+        return index
@@ -0,0 +1,65 @@
+import heapq
+from typing import List, Optional
+
+import numpy as np
+
+from inventory_columns import InventoryColumns
+
+SORT_COLUMNS = {
+    "price": ("price", False),
+    "kilometers": ("kilometers", False),
+    "year": ("year", True),
+    "power": ("power", True)
+}
+VALUE_WEIGHTS = {
+    "price": -0.45,
+    "kilometers": -0.25,
+    "year": 0.30
+}
+SORT_OPTIONS = list(SORT_COLUMNS) + ["value"]
+
+
+def value_scores(columns: InventoryColumns, rows: np.ndarray) -> np.ndarray:
+    scores = np.zeros(len(rows), dtype=np.float64)
+    for name, weight in VALUE_WEIGHTS.items():
+        column = columns.numeric[name]
+        values = column.values[rows]
+        usable = column.valid[rows] & np.isfinite(values)
+        normalized = np.full(len(rows), 0.0 if weight > 0 else 1.0)
+        if usable.any():
+            low, high = values[usable].min(), values[usable].max()
+            normalized[usable] = (values[usable] - low) / (high - low) if high > low else 0.5
+        scores += weight * normalized
+    return scores
+
+
+def sort_keys(columns: InventoryColumns, rows: np.ndarray, sort_by: str, descending: Optional[bool] = None) -> np.ndarray:
+    if sort_by == "value":
+        keys = -value_scores(columns, rows)
+        if descending is False:
+            keys = -keys
+        return keys
+
+    name, default_descending = SORT_COLUMNS[sort_by]
+    column = columns.numeric[name]
+    values = column.values[rows]
+    keys = -values if (default_descending if descending is None else descending) else values.copy()
+    keys[~(column.valid[rows] & np.isfinite(values))] = np.inf
+    return keys
+
+
+def top_rows(columns: InventoryColumns, rows: List[int], sort_by: str, k: int, descending: Optional[bool] = None) -> List[int]:
+    if not rows:
+        return []
+    keys = sort_keys(columns, np.asarray(rows, dtype=np.intp), sort_by, descending)
+    # The position breaks ties, so equally ranked cars keep the order Dealcar returned them in.
+    best = heapq.nsmallest(k, zip(keys.tolist(), range(len(rows)), rows))
+    return [row for _, _, row in best]
+
+
+def ranked_rows(columns: InventoryColumns, rows: List[int], sort_by: str, descending: Optional[bool] = None) -> List[int]:
+    if not rows:
+        return []
+    candidates = np.asarray(rows, dtype=np.intp)
+    order = np.argsort(sort_keys(columns, candidates, sort_by, descending), kind="stable")
+    return candidates[order].tolist()
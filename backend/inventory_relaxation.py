@@ -0,0 +1,116 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from inventory_columns import InventoryColumns
+from inventory_filter import filter_masks
+
+MAX_NEAR_MISSES = 2
+NEAR_MISS_CARS = 3
+
+
+class Relaxation:
+    def __init__(self, key: str, describe: Callable[[Any], str], replace: Optional[Callable[[Any], Any]] = None):
+        self.key = key
+        self.describe = describe
+        self.replace = replace
+
+    def applies(self, filters: Dict[str, Any]) -> bool:
+        value = filters.get(self.key)
+        if not value:
+            return False
+        return self.replace is None or isinstance(value, (int, float))
+
+    def relaxed_value(self, filters: Dict[str, Any]) -> Any:
+        return self.replace(filters[self.key]) if self.replace is not None else None
+
+
+def _drop(key: str) -> Relaxation:
+    return Relaxation(key, lambda value, key=key: f"dropped {key} {value}")
+
+
+def _widen(key: str, replace: Callable[[Any], Any]) -> Relaxation:
+    return Relaxation(key, lambda value, key=key: f"{key} {value} -> {replace(value)}", replace)
+
+
+# Cheapest compromises first: cosmetic filters, then small budget/age/mileage give, then whole constraints.
+# make is never relaxed; model only as a last resort.
+RELAXATIONS = [
+    _drop("color"),
+    _drop("version"),
+    _widen("max_price", lambda value: int(round(value * 1.1))),
+    _widen("min_price", lambda value: int(round(value * 0.9))),
+    _widen("year_min", lambda value: int(value) - 2),
+    _widen("max_kilometers", lambda value: int(round(value * 1.25))),
+    _drop("ecological_label"),
+    _drop("transmission"),
+    _widen("min_power", lambda value: int(round(value * 0.85))),
+    _drop("fuel"),
+    _drop("body_style"),
+    _drop("min_doors"),
+    _drop("max_doors"),
+    _drop("min_seats"),
+    _drop("max_seats"),
+    _drop("min_cc"),
+    _drop("max_cc"),
+    _drop("max_power"),
+    _drop("year_max"),
+    _drop("min_kilometers"),
+    _widen("max_price", lambda value: int(round(value * 1.25))),
+    _drop("year_min"),
+    _drop("model")
+]
+
+
+def _relaxed_filters(filters: Dict[str, Any], relaxation: Relaxation) -> Dict[str, Any]:
+    relaxed = dict(filters)
+    replacement = relaxation.relaxed_value(filters)
+    if replacement is None:
+        relaxed.pop(relaxation.key, None)
+    else:
+        relaxed[relaxation.key] = replacement
+    return relaxed
+
+
+class RelaxationSearch:
+    def __init__(self, columns: InventoryColumns, filters: Dict[str, Any]):
+        self.columns = columns
+        self.filters = filters
+        # Every relaxation touches a single filter, so the other filters' masks are computed once and reused.
+        self.masks = dict(filter_masks(columns, filters))
+
+    def _mask(self, filters: Dict[str, Any], relaxed_keys: List[str]) -> np.ndarray:
+        mask = self.columns.row_valid.copy()
+        for name, predicate_mask in self.masks.items():
+            if name not in relaxed_keys:
+                mask &= predicate_mask
+        replacements = {key: filters[key] for key in relaxed_keys if filters.get(key)}
+        for _, predicate_mask in filter_masks(self.columns, replacements):
+            mask &= predicate_mask
+        return mask
+
+    def near_misses(self) -> List[Tuple[Dict[str, Any], List[str], np.ndarray]]:
+        candidates = [relaxation for relaxation in RELAXATIONS if relaxation.applies(self.filters)]
+        found = []
+        for relaxation in candidates:
+            relaxed = _relaxed_filters(self.filters, relaxation)
+            rows = np.flatnonzero(self._mask(relaxed, [relaxation.key]))
+            if len(rows):
+                found.append((relaxed, [relaxation.describe(self.filters[relaxation.key])], rows))
+                if len(found) >= MAX_NEAR_MISSES:
+                    return found
+        if found:
+            return found
+
+        # No single compromise is enough: stack them in the same order until something matches.
+        relaxed, relaxed_keys, steps = dict(self.filters), [], []
+        for relaxation in candidates:
+            if not relaxation.applies(relaxed):
+                continue
+            steps.append(relaxation.describe(relaxed[relaxation.key]))
+            relaxed = _relaxed_filters(relaxed, relaxation)
+            relaxed_keys.append(relaxation.key)
+            rows = np.flatnonzero(self._mask(relaxed, relaxed_keys))
+            if len(rows):
+                return [(relaxed, steps, rows)]
+        return []
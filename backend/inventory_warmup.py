@@ -0,0 +1,91 @@
+import json
+import logging
+import re
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+
+from inventory_cache import InventoryCache
+
+logger = logging.getLogger(__name__)
+
+WARM_TOOLS = {"get_car_inventory", "get_inventory_facets"}
+# Only string values whose closing quote has already streamed in; a half-typed "VOLKSW is never resolved.
+PARTIAL_NAME = re.compile(r'"(make|model)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+# Started on response.output_item.added for a search tool, while the model is still streaming the arguments:
+# refreshes a stale snapshot early and resolves make/model spellings as soon as they are complete,
+# so the search that runs on arguments.done finds both already done.
+class SearchWarmup:
+    def __init__(self, cache: InventoryCache, tool_name: str):
+        self.cache = cache
+        self.tool_name = tool_name
+        self.refreshing = cache.warm_up()
+        self.resolved: Set[Tuple[str, ...]] = set()
+
+    def feed(self, arguments: str):
+        if '"make"' not in arguments and '"model"' not in arguments:
+            return
+        snapshot = self.cache.peek()
+        if snapshot is None:
+            return
+        makes: Tuple[str, ...] = ()
+        for key, raw in PARTIAL_NAME.findall(arguments):
+            try:
+                term = json.loads(f'"{raw}"')
+            except json.JSONDecodeError:
+                continue
+            if key == "make":
+                # Models are resolved within the corrected make, exactly as resolve_filters does on arguments.done.
+                makes = (snapshot.names.resolve_make(term),)
+                self.resolved.add(("make", term))
+            elif ("model", term, makes) not in self.resolved:
+                self.resolved.add(("model", term, makes))
+                snapshot.names.resolve_model(term, makes)
+
+    def finish(self, seconds: float):
+        warmup_stats.record(self, seconds)
+        logger.info(
+            f"[WARMUP] {self.tool_name}: {seconds * 1000:.0f}ms from arguments to result, "
+            f"refresh {'started early' if self.refreshing else 'not needed'}, {len(self.resolved)} names pre-resolved"
+        )
+
+
+def start_warmup(cache: InventoryCache, tool_name: Optional[str]) -> Optional[SearchWarmup]:
+    if tool_name not in WARM_TOOLS:
+        return None
+    return SearchWarmup(cache, tool_name)
+
+
+class WarmupStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.refreshes = 0
+        self.names = 0
+        self.refreshed_seconds = 0.0
+        self.fresh_seconds = 0.0
+
+    def record(self, warmup: SearchWarmup, seconds: float):
+        with self._lock:
+            self.searches += 1
+            self.names += len(warmup.resolved)
+            if warmup.refreshing:
+                self.refreshes += 1
+                self.refreshed_seconds += seconds
+            else:
+                self.fresh_seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            fresh = self.searches - self.refreshes
+            return {
+                "searches": self.searches,
+                "refreshes_started": self.refreshes,
+                "names_pre_resolved": self.names,
+                "avg_result_ms_after_refresh": round(self.refreshed_seconds * 1000 / self.refreshes, 1) if self.refreshes else 0.0,
+                "avg_result_ms_fresh": round(self.fresh_seconds * 1000 / fresh, 1) if fresh else 0.0
+            }
+
+
+warmup_stats = WarmupStats()
@@ -0,0 +1,223 @@
+import functools
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from inventory_columns import InventoryColumns
+from inventory_filter import make_matches, model_term_matches, normalize_make
+
+logger = logging.getLogger(__name__)
+
+# Alias -> canonical spellings to try, in order; only a spelling that is actually in stock is used.
+MAKE_ALIASES = {
+    "VW": ["VOLKSWAGEN"],
+    "VOLKS": ["VOLKSWAGEN"],
+    "MERCEDES BENZ": ["MERCEDES", "MERCEDES BENZ"],
+    "MERCEDESBENZ": ["MERCEDES", "MERCEDES BENZ"],
+    "MB": ["MERCEDES", "MERCEDES BENZ"],
+    "BENZ": ["MERCEDES", "MERCEDES BENZ"],
+    "CHEVY": ["CHEVROLET"],
+    "ALFA": ["ALFA ROMEO"],
+    "LANDROVER": ["LAND ROVER"],
+    "RANGE ROVER": ["LAND ROVER"],
+    "DS AUTOMOBILES": ["DS"],
+    "CITROEN DS": ["DS"],
+    "SSANGYONG": ["SSANGYONG", "KGM"],
+    "KGM": ["KGM", "SSANGYONG"],
+    "MINI COOPER": ["MINI"]
+}
+# Real brands, stocked or not: a brand we don't carry is never "corrected" into one we do (Lancia -> DACIA).
+KNOWN_MAKES = {
+    "ABARTH", "AIWAYS", "ALFA ROMEO", "ALPINA", "ALPINE", "ASTON MARTIN", "AUDI", "BENTLEY", "BMW", "BYD",
+    "CADILLAC", "CHEVROLET", "CHRYSLER", "CITROEN", "CUPRA", "DACIA", "DAEWOO", "DAIHATSU", "DODGE", "DS",
+    "FERRARI", "FIAT", "FORD", "GENESIS", "HONDA", "HYUNDAI", "INFINITI", "ISUZU", "IVECO", "JAGUAR", "JEEP",
+    "KGM", "KIA", "LADA", "LAMBORGHINI", "LANCIA", "LAND ROVER", "LEXUS", "LOTUS", "LYNK & CO", "MASERATI",
+    "MAXUS", "MAZDA", "MCLAREN", "MERCEDES", "MERCEDES BENZ", "MG", "MINI", "MITSUBISHI", "NISSAN", "OMODA",
+    "OPEL", "PEUGEOT", "POLESTAR", "PORSCHE", "RENAULT", "ROLLS ROYCE", "ROVER", "SAAB", "SEAT", "SKODA",
+    "SMART", "SSANGYONG", "SUBARU", "SUZUKI", "TESLA", "TOYOTA", "VOLKSWAGEN", "VOLVO"
+}
+MODEL_WORD_ALIASES = {
+    "class": "clase",
+    "series": "serie",
+    "classe": "clase",
+    "klasse": "clase"
+}
+
+MEMO_SIZE = 4096
+
+
+def edit_distance(a: str, b: str) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def max_typos(term: str) -> int:
+    if len(term) <= 3:
+        return 0
+    return 1 if len(term) <= 5 else 2
+
+
+def fuzzy_allowed(term: str) -> bool:
+    # Model names told apart by a number or a single letter ("3008"/"2008", "Serie 1"/"Serie 3", "Clase A"/"Clase C")
+    # are one edit from each other; correcting them would swap the car, so they are only ever matched exactly.
+    words = term.replace("-", " ").split()
+    return bool(words) and not any(len(word) == 1 or any(char.isdigit() for char in word) for word in words)
+
+
+def unique_match(matches: List[Tuple[int, str]]) -> Optional[str]:
+    # A typo is only corrected when a single spelling is closest; a tie means we would be guessing.
+    if not matches or (len(matches) > 1 and matches[1][0] == matches[0][0]):
+        return None
+    return matches[0][1]
+
+
+class BKTree:
+    def __init__(self, words: List[str]):
+        self.root: Optional[Tuple[str, Dict[int, Any]]] = None
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        if self.root is None:
+            self.root = (word, {})
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        if self.root is None:
+            return []
+        matches = []
+        pending = [self.root]
+        while pending:
+            candidate, children = pending.pop()
+            distance = edit_distance(word, candidate)
+            if distance <= max_distance:
+                matches.append((distance, candidate))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    pending.append(child)
+        return sorted(matches)
+
+
+def model_tree(models: List[str]) -> BKTree:
+    words = {word for model in models for word in model.replace("-", " ").split()}
+    return BKTree(sorted(set(models) | words))
+
+
+class NameResolver:
+    def __init__(self, columns: InventoryColumns):
+        make_column, model_column = columns.categorical["make"], columns.categorical["model"]
+        makes = [value for value in make_column.categories if isinstance(value, str) and value]
+        models = [value for value in model_column.categories if isinstance(value, str) and value]
+        self.makes = sorted({normalize_make(make) for make in makes})
+        self.models = sorted({model.lower() for model in models})
+        self.models_by_make: Dict[str, set] = {}
+        for make_code, model_code in set(zip(make_column.codes.tolist(), model_column.codes.tolist())):
+            make, model = make_column.categories[make_code], model_column.categories[model_code]
+            if isinstance(make, str) and make and isinstance(model, str) and model:
+                self.models_by_make.setdefault(normalize_make(make), set()).add(model.lower())
+        self.make_tree = BKTree(self.makes)
+        self.model_tree = model_tree(self.models)
+        self._make_model_trees: Dict[Tuple[str, ...], BKTree] = {}
+        # lru_cache is safe to share between the warm-up and tool worker threads; a plain dict memo was not.
+        self.resolve_make = functools.lru_cache(maxsize=MEMO_SIZE)(self._resolve_make)
+        self.resolve_model = functools.lru_cache(maxsize=MEMO_SIZE)(self._resolve_model)
+
+    def _make_in_stock(self, term: str) -> bool:
+        return any(make_matches(make, term) for make in self.makes)
+
+    def _model_in_stock(self, term: str) -> bool:
+        return any(model_term_matches(model, term) for model in self.models)
+
+    def _resolve_make(self, term: str) -> str:
+        if not term.strip() or self._make_in_stock(term):
+            return term
+        normalized = normalize_make(term)
+        for candidate in MAKE_ALIASES.get(normalized, []) + MAKE_ALIASES.get(normalized.replace(" ", ""), []):
+            if self._make_in_stock(candidate):
+                return candidate
+        if normalized in KNOWN_MAKES or normalized in MAKE_ALIASES or not fuzzy_allowed(normalized):
+            return term
+        # Typos rarely hit the first letter, so a candidate that starts differently is taken as another brand.
+        matches = [match for match in self.make_tree.search(normalized, max_typos(normalized)) if match[1][0] == normalized[0]]
+        return unique_match(matches) or term
+
+    def clear_memo(self):
+        self.resolve_make.cache_clear()
+        self.resolve_model.cache_clear()
+
+    def _tree_for_makes(self, makes: Tuple[str, ...]) -> Optional[BKTree]:
+        if not makes:
+            return self.model_tree
+        if makes not in self._make_model_trees:
+            models = {
+                model
+                for stock_make, stock_models in self.models_by_make.items()
+                if any(make_matches(stock_make, make) for make in makes)
+                for model in stock_models
+            }
+            self._make_model_trees[makes] = model_tree(sorted(models)) if models else None
+        return self._make_model_trees[makes]
+
+    def _resolve_model(self, term: str, makes: Tuple[str, ...] = ()) -> str:
+        if not term.strip() or self._model_in_stock(term):
+            return term
+        words = term.lower().replace("-", " ").split()
+        aliased = " ".join(MODEL_WORD_ALIASES.get(word, word) for word in words)
+        if aliased != term.lower() and self._model_in_stock(aliased):
+            return aliased
+        tree = self._tree_for_makes(makes)
+        if tree is None or not fuzzy_allowed(aliased):
+            return term
+        return unique_match(tree.search(aliased, max_typos(aliased))) or term
+
+    def _resolve_terms(self, value: Any, resolve) -> Any:
+        if isinstance(value, str):
+            return resolve(value)
+        if isinstance(value, list):
+            return [resolve(term) if isinstance(term, str) else term for term in value]
+        return value
+
+    def resolve_filters(self, arguments: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, str]]]:
+        corrections: Dict[str, Dict[str, str]] = {}
+        resolved = arguments
+        for key in ("make", "model"):
+            value = arguments.get(key)
+            if not value:
+                continue
+            if key == "make":
+                resolve = self.resolve_make
+            else:
+                # Typos in the model are only corrected towards models of the (already resolved) requested make.
+                make = resolved.get("make")
+                makes = tuple(term for term in (make if isinstance(make, list) else [make]) if isinstance(term, str) and term)
+                resolve = lambda term, makes=makes: self.resolve_model(term, makes)
+            new_value = self._resolve_terms(value, resolve)
+            if new_value == value:
+                continue
+            if resolved is arguments:
+                resolved = dict(arguments)
+            resolved[key] = new_value
+            originals = value if isinstance(value, list) else [value]
+            replacements = new_value if isinstance(new_value, list) else [new_value]
+            corrections[key] = {original: replacement for original, replacement in zip(originals, replacements) if original != replacement}
+            logger.info(f"[RESOLVE] {key}: {corrections[key]}")
+        return resolved, corrections
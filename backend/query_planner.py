@@ -0,0 +1,171 @@
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from inventory_filter import FAMILY_CAR_STYLES, RANGE_FILTERS, make_matches, normalize_ecological_label, normalize_transmission
+from inventory_index import FilterIndex
+
+
+class PlanStep:
+    def __init__(self, name: str, estimate: int, rows_fn: Callable[[], np.ndarray], apply_fn: Callable[[np.ndarray], np.ndarray]):
+        self.name = name
+        self.estimate = estimate
+        self.rows_fn = rows_fn
+        self.apply_fn = apply_fn
+
+    def rows(self) -> np.ndarray:
+        return self.rows_fn()
+
+    def apply(self, candidates: np.ndarray) -> np.ndarray:
+        return self.apply_fn(candidates)
+
+
+def _safe_keys(fn: Callable[[], List[Any]]) -> List[Any]:
+    try:
+        return fn()
+    except Exception:
+        return []
+
+
+def _posting_keys(index: FilterIndex, name: str, wanted: Any) -> List[Any]:
+    postings = index.postings[name]
+    if name == "make":
+        return _safe_keys(lambda: [key for key in postings.keys() if make_matches(key, wanted)])
+    if name == "fuel":
+        return _safe_keys(lambda: [wanted.upper()])
+    if name == "transmission":
+        return _safe_keys(lambda: [normalize_transmission(wanted)])
+    if name == "body_style":
+        return _safe_keys(lambda: [wanted.upper()])
+    if name == "color":
+        return _safe_keys(lambda: [key for key in postings.keys() if wanted.lower() in key])
+    if name == "ecological_label":
+        return _safe_keys(lambda: [normalize_ecological_label(wanted)])
+    return []
+
+
+def _posting_step(index: FilterIndex, name: str, wanted: Any) -> PlanStep:
+    postings = index.postings[name]
+    if name == "body_style" and isinstance(wanted, str) and wanted.upper() in FAMILY_CAR_STYLES:
+        keys = index.groups["family"]
+    else:
+        keys = _posting_keys(index, name, wanted)
+    estimate = sum(len(postings.get(key)) for key in keys)
+    cache: Dict[str, np.ndarray] = {}
+
+    def rows() -> np.ndarray:
+        if "rows" not in cache:
+            cache["rows"] = postings.union(keys)
+        return cache["rows"]
+
+    return PlanStep(f"{name} in {keys}", estimate, rows, lambda candidates: postings.probe(candidates, keys))
+
+
+def _range_step(index: FilterIndex, name: str, low: Optional[float], high: Optional[float]) -> PlanStep:
+    sorted_column = index.ranges[name]
+    column = sorted_column.column
+
+    def apply(candidates: np.ndarray) -> np.ndarray:
+        keep = column.valid[candidates]
+        values = column.values[candidates]
+        if low is not None:
+            keep &= ~(values < low)
+        if high is not None:
+            keep &= ~(values > high)
+        return candidates[keep]
+
+    label = f"{name} in [{'-inf' if low is None else low}, {'inf' if high is None else high}]"
+    return PlanStep(label, sorted_column.count(low, high), lambda: sorted_column.rows(low, high), apply)
+
+
+def _category_step(index: FilterIndex, name: str, table: np.ndarray) -> PlanStep:
+    column = index.columns.categorical[name]
+    estimate = int(column.counts[table].sum())
+    return PlanStep(
+        f"{name} in {int(table.sum())} of {len(table)} values",
+        estimate,
+        lambda: np.flatnonzero(table[column.codes] & index.columns.row_valid),
+        lambda candidates: candidates[table[column.codes[candidates]]]
+    )
+
+
+class FilterPlan:
+    def __init__(self, index: FilterIndex, steps: List[PlanStep], rejected_by: Optional[str] = None):
+        self.index = index
+        self.steps = steps
+        self.rejected_by = rejected_by
+        self.trace: List[Dict[str, Any]] = []
+
+    def execute(self) -> np.ndarray:
+        self.trace = []
+        if self.rejected_by is not None:
+            self.trace.append({"step": self.rejected_by, "estimate": 0, "rows_in": len(self.index.all_rows), "rows_out": 0, "eliminated": len(self.index.all_rows), "ms": 0.0})
+            return np.empty(0, dtype=np.intp)
+        if not self.steps:
+            return self.index.all_rows
+
+        candidates = self.index.all_rows
+        for position, step in enumerate(self.steps):
+            rows_in = len(candidates)
+            started = time.perf_counter()
+            candidates = step.rows() if position == 0 else step.apply(candidates)
+            self.trace.append({
+                "step": step.name,
+                "estimate": step.estimate,
+                "rows_in": rows_in,
+                "rows_out": len(candidates),
+                "eliminated": rows_in - len(candidates),
+                "ms": round((time.perf_counter() - started) * 1000, 3)
+            })
+            if not len(candidates):
+                break
+        return candidates
+
+    def rows(self) -> List[int]:
+        return self.execute().tolist()
+
+    def explain(self) -> Dict[str, Any]:
+        rows = self.execute()
+        return {
+            "vehicles": len(self.index.all_rows),
+            "plan": [step.name for step in self.steps] if self.rejected_by is None else [self.rejected_by],
+            "steps": self.trace,
+            "results": len(rows)
+        }
+
+    def summary(self) -> str:
+        return " -> ".join(f"{entry['step']} ({entry['rows_in']}->{entry['rows_out']})" for entry in self.trace) or "no filters"
+
+
+def compile_filters(index: FilterIndex, filters: Dict[str, Any]) -> FilterPlan:
+    steps = []
+    for name in index.postings:
+        if filters.get(name):
+            steps.append(_posting_step(index, name, filters[name]))
+
+    if filters.get("model"):
+        steps.append(_category_step(index, "model", index.models.category_table(filters["model"])))
+    if filters.get("version"):
+        version_column = index.columns.categorical["version"]
+        steps.append(_category_step(index, "version", version_column.category_mask(lambda value, wanted=filters["version"]: wanted.lower() in value.lower())))
+
+    bounds: Dict[str, Dict[str, float]] = {}
+    for key, column, bound_kind in RANGE_FILTERS:
+        bound = filters.get(key)
+        if not bound:
+            continue
+        if not isinstance(bound, (int, float)):
+            return FilterPlan(index, [], rejected_by=f"{key} is not a number")
+        column_bounds = bounds.setdefault(column, {})
+        side = "high" if bound_kind == "at_most" else "low"
+        column_bounds[side] = bound
+    for column, column_bounds in bounds.items():
+        steps.append(_range_step(index, column, column_bounds.get("low"), column_bounds.get("high")))
+
+    steps.sort(key=lambda step: step.estimate)
+    return FilterPlan(index, steps)
+
+
+def plan_rows(index: FilterIndex, filters: Dict[str, Any]) -> List[int]:
+    return compile_filters(index, filters).rows()
@@ -0,0 +1,107 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ResultSet:
+    def __init__(self, set_id: str, arguments: Dict[str, Any], version: int):
+        self.set_id = set_id
+        self.arguments = arguments
+        self.version = version
+        self.rows: Optional[List[int]] = None
+        self.touched_at = time.time()
+
+    @property
+    def size(self) -> int:
+        return len(self.rows) if self.rows is not None else 0
+
+
+class CursorStore:
+    def __init__(self, ttl_seconds: float, max_sets_per_session: int, max_rows: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sets_per_session = max_sets_per_session
+        self.max_rows = max_rows
+        self._sessions: Dict[str, "OrderedDict[str, ResultSet]"] = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.pages_served = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def open(self, session_id: str, arguments: Dict[str, Any], version: int) -> str:
+        set_id = secrets.token_hex(4)
+        with self._lock:
+            self._expire(time.time())
+            sets = self._sessions.setdefault(session_id, OrderedDict())
+            sets[set_id] = ResultSet(set_id, arguments, version)
+            while len(sets) > self.max_sets_per_session:
+                sets.popitem(last=False)
+                self.evicted += 1
+            self.opened += 1
+        return set_id
+
+    def resolve(self, session_id: str, cursor: str) -> Optional[Tuple[ResultSet, int]]:
+        set_id, _, offset = cursor.partition("-")
+        if not offset.isdigit():
+            return None
+        with self._lock:
+            self._expire(time.time())
+            sets = self._sessions.get(session_id)
+            result_set = sets.get(set_id) if sets else None
+            if result_set is None:
+                return None
+            sets.move_to_end(set_id)
+            result_set.touched_at = time.time()
+            self.pages_served += 1
+        return result_set, int(offset)
+
+    def store_rows(self, result_set: ResultSet, rows: List[int], version: int):
+        with self._lock:
+            result_set.rows = rows
+            result_set.version = version
+            self._enforce_row_cap(result_set)
+
+    def _expire(self, now: float):
+        for session_id in list(self._sessions):
+            sets = self._sessions[session_id]
+            for set_id in [set_id for set_id, result_set in sets.items() if now - result_set.touched_at >= self.ttl_seconds]:
+                del sets[set_id]
+                self.expired += 1
+            if not sets:
+                del self._sessions[session_id]
+
+    def _enforce_row_cap(self, keep: ResultSet):
+        total = sum(result_set.size for sets in self._sessions.values() for result_set in sets.values())
+        if total <= self.max_rows:
+            return
+        oldest = sorted(
+            (result_set for sets in self._sessions.values() for result_set in sets.values() if result_set is not keep and result_set.rows is not None),
+            key=lambda result_set: result_set.touched_at
+        )
+        for result_set in oldest:
+            if total <= self.max_rows:
+                break
+            total -= result_set.size
+            result_set.rows = None
+            self.evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sets = [result_set for session_sets in self._sessions.values() for result_set in session_sets.values()]
+            return {
+                "sessions": len(self._sessions),
+                "result_sets": len(sets),
+                "rows_held": sum(result_set.size for result_set in sets),
+                "max_rows": self.max_rows,
+                "ttl_seconds": self.ttl_seconds,
+                "opened": self.opened,
+                "pages_served": self.pages_served,
+                "expired": self.expired,
+                "evicted": self.evicted
+            }
+
+
+def page_cursor(set_id: str, offset: int) -> str:
+    return f"{set_id}-{offset}"
@@ -0,0 +1,57 @@
+import logging
+import marshal
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RNVI"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHd")
+
+
+def save_snapshot(path: str, payload: Dict[str, Any]) -> int:
+    started = time.perf_counter()
+    body = marshal.dumps(payload)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, time.time()))
+        f.write(body)
+    os.replace(tmp_path, path)
+
+    size = HEADER.size + len(body)
+    logger.info(f"[SNAPSHOT STORE] Saved {len(payload.get('vehicles', []))} vehicles to {path} ({size / 1024:.1f} KiB) in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return size
+
+
+def load_snapshot(path: str) -> Optional[Tuple[Dict[str, Any], float]]:
+    if not os.path.exists(path):
+        logger.info(f"[SNAPSHOT STORE] No snapshot at {path}")
+        return None
+
+    started = time.perf_counter()
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, format_version, saved_at = HEADER.unpack_from(mapped, 0)
+            if magic != MAGIC or format_version != FORMAT_VERSION:
+                logger.warning(f"[SNAPSHOT STORE] Ignoring {path}: unknown format {magic!r} v{format_version}")
+                return None
+            view = memoryview(mapped)[HEADER.size:]
+            try:
+                payload = marshal.loads(view)
+            finally:
+                view.release()
+            size = len(mapped)
+    except (OSError, ValueError, EOFError, TypeError, struct.error) as e:
+        logger.warning(f"[SNAPSHOT STORE] Could not load {path}: {str(e)}")
+        return None
+
+    logger.info(f"[SNAPSHOT STORE] Loaded {len(payload.get('vehicles', []))} vehicles from {path} ({size / 1024:.1f} KiB, saved {time.time() - saved_at:.0f}s ago) in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return payload, saved_at
@@ -0,0 +1,116 @@
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+CAR_SUMMARY_FIELDS = {
+    "vehicleId": lambda car: car.get("vehicleId"),
+    "make": lambda car: car.get("make"),
+    "model": lambda car: car.get("model"),
+    "version": lambda car: car.get("version"),
+    "year": lambda car: car.get("year"),
+    "price": lambda car: car.get("price"),
+    "km": lambda car: car.get("kilometers"),
+    "fuel": lambda car: car.get("fuel"),
+    "transmission": lambda car: (car.get("specs") or {}).get("transmission"),
+    "power": lambda car: (car.get("specs") or {}).get("power"),
+    "body_style": lambda car: (car.get("specs") or {}).get("body_style"),
+    "doors": lambda car: (car.get("specs") or {}).get("doors"),
+    "seats": lambda car: (car.get("specs") or {}).get("seats"),
+    "color": lambda car: (car.get("specs") or {}).get("color"),
+    "ecological_label": lambda car: (car.get("specs") or {}).get("ecological_label")
+}
+
+
+def car_summary(car: Any) -> Any:
+    if not isinstance(car, dict):
+        return car
+    summary = {}
+    for field, getter in CAR_SUMMARY_FIELDS.items():
+        value = getter(car)
+        if value not in (None, ""):
+            summary[field] = value
+    return summary
+
+
+def project_inventory(result: Dict[str, Any]) -> Dict[str, Any]:
+    if not isinstance(result.get("cars"), list):
+        return result
+    projected = dict(result)
+    projected["cars"] = [car_summary(car) for car in result["cars"]]
+    if result.get("near_misses"):
+        projected["near_misses"] = [dict(miss, cars=[car_summary(car) for car in miss["cars"]]) for miss in result["near_misses"]]
+    return projected
+
+
+TOOL_PROJECTIONS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "get_car_inventory": project_inventory
+}
+
+
+def count_tokens(text: str) -> int:
+    if tiktoken is not None:
+        return len(_encoding().encode(text))
+    # Without tiktoken, ~4 characters per token is close enough for JSON to compare sizes.
+    return (len(text) + 3) // 4
+
+
+_ENCODING = None
+
+
+def _encoding():
+    global _ENCODING
+    if _ENCODING is None:
+        _ENCODING = tiktoken.get_encoding("o200k_base")
+    return _ENCODING
+
+
+class ToolOutputReport:
+    def __init__(self, enabled: bool = True):
+        # Measuring serializes the full output as well and tokenizes both; only done where /stats can show it.
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.tools: Dict[str, Dict[str, int]] = {}
+
+    def record(self, tool_name: str, full_tokens: int, sent_tokens: int):
+        with self._lock:
+            totals = self.tools.setdefault(tool_name, {"calls": 0, "full_tokens": 0, "sent_tokens": 0})
+            totals["calls"] += 1
+            totals["full_tokens"] += full_tokens
+            totals["sent_tokens"] += sent_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "token_counter": "tiktoken" if tiktoken is not None else "estimate",
+                "tools": {
+                    name: dict(totals, saved_pct=round(100 * (1 - totals["sent_tokens"] / totals["full_tokens"]), 1) if totals["full_tokens"] else 0.0)
+                    for name, totals in self.tools.items()
+                }
+            }
+
+
+tool_output_report = ToolOutputReport(enabled=settings.allow_debug_searches)
+
+
+def tool_output(tool_name: Optional[str], result: Any, enabled: bool = True) -> str:
+    projection = TOOL_PROJECTIONS.get(tool_name) if enabled else None
+    if projection is None or not isinstance(result, dict):
+        return json.dumps(result)
+
+    sent = json.dumps(projection(result))
+    if tool_output_report.enabled:
+        full_tokens, sent_tokens = count_tokens(json.dumps(result)), count_tokens(sent)
+        tool_output_report.record(tool_name, full_tokens, sent_tokens)
+        logger.info(f"[TOKENS] {tool_name} output: {full_tokens} -> {sent_tokens} tokens ({full_tokens - sent_tokens} saved)")
+    return sent
@@ -1,16 +1,29 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 import json
 from datetime import datetime
 import requests
 import os
 import logging
 import re
+import time
 from config import settings
+from concurrency import bounded_map, keyed_semaphore
+from http_client import http_client
+from inventory_cache import InventoryCache, InventoryFetchError, InventorySnapshot
+from inventory_columns import InventoryColumns
+from inventory_index import FilterIndex
+from inventory_relaxation import NEAR_MISS_CARS, RelaxationSearch
+from inventory_ranking import SORT_OPTIONS, ranked_rows, top_rows
+from inventory_facets import facet_counts
+from inventory_filter import FilterDiagnostics, canonical_filters, filter_rows
+from query_planner import compile_filters
+from result_cache import ResultCache
+from search_cursors import CursorStore, page_cursor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-DEALCAR_API_URL = "https://api.dealcar.io/stock"
+DEALCAR_API_URL = settings.dealcar_api_url
 DEALER_ID = "e1cb5c3a-d3e7-496f-b077-98aa50aef206"
 DEALCAR_API_KEY = settings.dealcar_api_key or ""
 
@@ -24,28 +37,6 @@ def extract_car_id_from_url(url: str) -> Optional[str]:
         return match.group(1)
     return None
 
-def normalize_transmission(transmission: str) -> str:
-    trans_upper = transmission.upper()
-    if trans_upper in ["MANUAL", "M"]:
-        return "M"
-    elif trans_upper in ["AUTOMATIC", "AUTO", "A"]:
-        return "A"
-    return transmission
-
-def normalize_ecological_label(label: str) -> str:
-    label_upper = label.upper().strip()
-    
-    if label_upper in ["0", "CERO", "ZERO"]:
-        return "0"
-    elif label_upper in ["ECO"]:
-        return "ECO"
-    elif label_upper in ["C"]:
-        return "C"
-    elif label_upper in ["B"]:
-        return "B"
-    
-    return label_upper
-
 def format_fuel_type(fuel: str) -> str:
     if not fuel:
         return "N/D"
@@ -97,7 +88,7 @@ def enviar_whatsapp(to: str, message_type: str, **kwargs) -> Dict[str, Any]:
         })
     
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+        response = http_client.post(url, json=payload, headers=headers)
         logger.info(f"[WHATSAPP MAKE] Sent {message_type} to {to} - Status: {response.status_code}")
         logger.info(f"[WHATSAPP MAKE] Response: {response.text}")
         
@@ -156,7 +147,15 @@ AVAILABLE_TOOLS = [
                 "max_cc": {"type": "integer", "description": "Maximum engine displacement in cc"},
                 "ecological_label": {"type": "string", "description": "Ecological label: 0/CERO (zero emissions), ECO (eco), C, B. Use '0' or 'CERO' for zero emissions vehicles."},
                 "min_kilometers": {"type": "number", "description": "Minimum kilometers"},
-                "max_kilometers": {"type": "number", "description": "Maximum kilometers"}
+                "max_kilometers": {"type": "number", "description": "Maximum kilometers"},
+                "sort_by": {
+                    "type": "string",
+                    "enum": ["price", "kilometers", "year", "power", "value"],
+                    "description": "Rank all matching cars before picking the 7 to show: price (cheapest first), kilometers (lowest first), year (newest first), power (most powerful first), value (best balance of price, mileage and age). Use it when the customer asks for the cheapest, newest, least driven, most powerful or best value cars instead of searching again."
+                },
+                "sort_order": {"type": "string", "enum": ["asc", "desc"], "description": "Optional: reverse the default direction of sort_by (e.g. 'desc' with price for the most expensive first)"},
+                "cursor": {"type": "string", "description": "The next_cursor value from a previous get_car_inventory result. Pass it on its own to get the next 7 cars of that same search when the customer asks to see more."},
+                "include_facets": {"type": "boolean", "description": "Optional: also return how the matching cars split by make, fuel, bodyStyle, transmission, price band and year band"}
             },
             "required": []
         }
@@ -208,64 +207,93 @@ AVAILABLE_TOOLS = [
     }
 ]
 
-def fetch_dealcar_inventory(max_pages: int = 20) -> Optional[Dict[str, Any]]:
+SEARCH_ONLY_PARAMETERS = {"display_ids", "sort_by", "sort_order", "cursor", "include_facets"}
+
+AVAILABLE_TOOLS.insert(1, {
+    "type": "function",
+    "name": "get_inventory_facets",
+    "description": "Count the cars in stock that match a set of filters, broken down by make, fuel, bodyStyle, transmission, price band and year band. Does not show any cars. Use it before searching when you are unsure which makes, body styles or budgets are actually available, so the next get_car_inventory call can be narrowed in one go instead of guessing.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            key: value for key, value in AVAILABLE_TOOLS[0]["parameters"]["properties"].items()
+            if key not in SEARCH_ONLY_PARAMETERS
+        },
+        "required": []
+    }
+})
+
+def _fetch_inventory_page(dealer_id: str, page: int) -> Dict[str, Any]:
+    params = {
+        "dealerId": dealer_id,
+        "status": "AVAILABLE",
+        "page": page
+    }
+    headers = {
+        "X-API-KEY": DEALCAR_API_KEY
+    }
+    
+    logger.info(f"[DEALCAR API] Requesting page {page}")
+    with keyed_semaphore(dealer_id, settings.dealcar_fetch_concurrency):
+        response = http_client.get(DEALCAR_API_URL, params=params, headers=headers)
+    
+    if response.status_code == 401:
+        logger.error(f"[DEALCAR API] Authorization failed - Status: 401")
+        logger.error(f"[DEALCAR API] Response body: {response.text}")
+        return {"error": "Authorization failed: Invalid or missing API key"}
+    elif response.status_code == 403:
+        logger.error(f"[DEALCAR API] Access forbidden - Status: 403")
+        logger.error(f"[DEALCAR API] Response body: {response.text}")
+        return {"error": "Access forbidden: Insufficient permissions"}
+    
+    response.raise_for_status()
+    return response.json()
+
+def fetch_dealcar_inventory(max_pages: int = 20, concurrency: Optional[int] = None, dealer_id: str = DEALER_ID) -> Optional[Dict[str, Any]]:
+    if concurrency is None:
+        concurrency = settings.dealcar_fetch_concurrency
+    
     try:
-        logger.info(f"[DEALCAR API] Starting inventory fetch - Dealer ID: {DEALER_ID}")
+        logger.info(f"[DEALCAR API] Starting inventory fetch - Dealer ID: {dealer_id}")
         logger.info(f"[DEALCAR API] API Key present: {bool(DEALCAR_API_KEY)}")
         logger.info(f"[DEALCAR API] URL: {DEALCAR_API_URL}")
         
-        all_vehicles = []
-        page = 1
-        total_pages = None
-        total_elements = 0
+        first_page = _fetch_inventory_page(dealer_id, 1)
+        if "error" in first_page:
+            return first_page
         
-        while page <= max_pages:
-            params = {
-                "dealerId": DEALER_ID,
-                "status": "AVAILABLE",
-                "page": page
-            }
-            headers = {
-                "X-API-KEY": DEALCAR_API_KEY
-            }
-            
-            logger.info(f"[DEALCAR API] Requesting page {page}")
-            response = requests.get(DEALCAR_API_URL, params=params, headers=headers, timeout=10)
-            
-            if response.status_code == 401:
-                logger.error(f"[DEALCAR API] Authorization failed - Status: 401")
-                logger.error(f"[DEALCAR API] Response body: {response.text}")
-                return {"error": "Authorization failed: Invalid or missing API key"}
-            elif response.status_code == 403:
-                logger.error(f"[DEALCAR API] Access forbidden - Status: 403")
-                logger.error(f"[DEALCAR API] Response body: {response.text}")
-                return {"error": "Access forbidden: Insufficient permissions"}
-            
-            response.raise_for_status()
-            page_data = response.json()
-            
+        total_pages = first_page.get("totalPages", 0)
+        total_elements = first_page.get("totalElements", 0)
+        logger.info(f"[DEALCAR API] Total pages: {total_pages}, Total elements: {total_elements}")
+        
+        last_page = min(total_pages, max_pages)
+        remaining_pages = list(range(2, last_page + 1))
+        
+        if concurrency > 1 and remaining_pages:
+            logger.info(f"[DEALCAR API] Fetching pages 2-{last_page} with concurrency {concurrency}")
+            pages = bounded_map(lambda page: _fetch_inventory_page(dealer_id, page), remaining_pages, concurrency)
+        else:
+            pages = []
+            for page in remaining_pages:
+                page_data = _fetch_inventory_page(dealer_id, page)
+                if "error" in page_data:
+                    return page_data
+                pages.append(page_data)
+        
+        all_vehicles = list(first_page.get("vehicles", []))
+        for page, page_data in zip(remaining_pages, pages):
+            if "error" in page_data:
+                return page_data
             vehicles = page_data.get("vehicles", [])
             all_vehicles.extend(vehicles)
-            
-            if total_pages is None:
-                total_pages = page_data.get("totalPages", 0)
-                total_elements = page_data.get("totalElements", 0)
-                logger.info(f"[DEALCAR API] Total pages: {total_pages}, Total elements: {total_elements}")
-            
             logger.info(f"[DEALCAR API] Page {page}: Fetched {len(vehicles)} vehicles (Total so far: {len(all_vehicles)})")
-            
-            if page >= total_pages:
-                logger.info(f"[DEALCAR API] Reached last page ({page}/{total_pages})")
-                break
-            
-            page += 1
         
         logger.info(f"[DEALCAR API] Inventory fetch complete: {len(all_vehicles)} total vehicles")
         
         return {
             "vehicles": all_vehicles,
             "totalElements": total_elements,
-            "totalPages": total_pages or page
+            "totalPages": total_pages or max(last_page, 1)
         }
         
     except requests.RequestException as e:
@@ -280,19 +308,16 @@ def fetch_car_by_id(vehicle_id: str) -> Optional[Dict[str, Any]]:
     try:
         logger.info(f"[DEALCAR API] Fetching car by ID: {vehicle_id}")
         
-        api_response = fetch_dealcar_inventory()
-        
-        if "error" in api_response:
-            logger.error(f"[DEALCAR API] Error fetching inventory: {api_response['error']}")
-            return api_response
-        
-        vehicles = api_response.get("vehicles", [])
-        logger.info(f"[DEALCAR API] Searching through {len(vehicles)} vehicles")
+        try:
+            snapshot = get_inventory_snapshot()
+        except InventoryFetchError as e:
+            logger.error(f"[DEALCAR API] Error fetching inventory: {str(e)}")
+            return {"error": str(e)}
         
-        for vehicle in vehicles:
-            if vehicle.get("vehicleId") == vehicle_id:
-                logger.info(f"[DEALCAR API] Vehicle found: {vehicle.get('make')} {vehicle.get('model')}")
-                return vehicle
+        vehicle = snapshot.index.get(vehicle_id)
+        if vehicle is not None:
+            logger.info(f"[DEALCAR API] Vehicle found: {vehicle.get('make')} {vehicle.get('model')}")
+            return vehicle
         
         logger.warning(f"[DEALCAR API] Vehicle not found: {vehicle_id}")
         return {"error": f"Vehicle with ID {vehicle_id} not found in inventory"}
@@ -301,238 +326,36 @@ def fetch_car_by_id(vehicle_id: str) -> Optional[Dict[str, Any]]:
         logger.error(f"[DEALCAR API] Error fetching car by ID: {str(e)}")
         return {"error": f"Error fetching car: {str(e)}"}
 
-def normalize_make(make: str) -> str:
-    return make.upper().replace("_", " ").replace("-", " ").strip()
+def _trace_label(vehicle: Any) -> str:
+    if not isinstance(vehicle, dict):
+        return repr(vehicle)[:40]
+    return f"{vehicle.get('make')} {vehicle.get('model')} ({str(vehicle.get('vehicleId', 'N/A'))[:8]})"
 
-def filter_vehicles(vehicles: list, filters: Dict[str, Any]) -> list:
-    filtered = []
-    
-    logger.info(f"[FILTER] Starting with {len(vehicles)} vehicles")
-    logger.info(f"[FILTER] Applied filters: {json.dumps(filters, indent=2)}")
-    
-    if filters.get("make"):
-        make_filter = filters["make"]
-        available_makes = set(v.get("make", "N/A") for v in vehicles)
-        normalized_available = set(normalize_make(m) for m in available_makes)
-        if isinstance(make_filter, list):
-            logger.info(f"[FILTER] Looking for multiple makes: {make_filter}")
-        else:
-            logger.info(f"[FILTER] Looking for make: {make_filter}")
-        logger.info(f"[FILTER] Available makes in inventory: {sorted(available_makes)}")
-        logger.info(f"[FILTER] Available makes (normalized): {sorted(normalized_available)}")
-    
-    if filters.get("model"):
-        model_filter = filters["model"]
-        available_models = set(v.get("model", "N/A") for v in vehicles)
-        if isinstance(model_filter, list):
-            logger.info(f"[FILTER] Looking for multiple models: {model_filter}")
-        else:
-            logger.info(f"[FILTER] Looking for model: {model_filter}")
-        logger.info(f"[FILTER] Available models in inventory: {sorted(available_models)}")
-    
-    if filters.get("body_style"):
-        logger.info(f"[FILTER] Looking for body_style: {filters['body_style']}")
-        available_body_styles = set(v.get("bodyStyle", "N/A") for v in vehicles)
-        logger.info(f"[FILTER] Available body styles in API response: {available_body_styles}")
+def filter_vehicle_rows(vehicles: list, filters: Dict[str, Any], index: Optional[FilterIndex] = None, trace: bool = False) -> List[int]:
+    plan = None
+    if index is not None:
+        plan = compile_filters(index, filters)
+        rows = plan.rows()
+        columns = index.columns
+    else:
+        columns = InventoryColumns(vehicles)
+        rows = filter_rows(columns, filters)
     
-    for vehicle in vehicles:
-        try:
-            vehicle_id_str = f"{vehicle.get('make')} {vehicle.get('model')} ({vehicle.get('vehicleId', 'N/A')[:8]})"
-            
-            if filters.get("make"):
-                make_filter = filters["make"]
-                vehicle_make_normalized = normalize_make(vehicle.get("make", ""))
-                
-                if isinstance(make_filter, list):
-                    normalized_filters = [normalize_make(m) for m in make_filter if m]
-                    if not any(vehicle_make_normalized == nf or nf in vehicle_make_normalized for nf in normalized_filters):
-                        logger.info(f"[FILTER] ❌ {vehicle_id_str} - make '{vehicle.get('make')}' (normalized: '{vehicle_make_normalized}') not in {normalized_filters}")
-                        continue
-                else:
-                    make_filter_normalized = normalize_make(make_filter)
-                    if vehicle_make_normalized != make_filter_normalized and make_filter_normalized not in vehicle_make_normalized:
-                        logger.info(f"[FILTER] ❌ {vehicle_id_str} - make '{vehicle.get('make')}' (normalized: '{vehicle_make_normalized}') != '{make_filter_normalized}'")
-                        continue
-                logger.info(f"[FILTER] ✓ {vehicle_id_str} - make filter passed")
-            
-            if filters.get("model"):
-                model_filter = filters["model"]
-                vehicle_model = vehicle.get("model", "")
-                vehicle_model_lower = vehicle_model.lower()
-                vehicle_model_words = set(vehicle_model_lower.replace("-", " ").split())
-                
-                matched = False
-                if isinstance(model_filter, list):
-                    for m in model_filter:
-                        if not m:
-                            continue
-                        m_lower = m.lower()
-                        m_words = set(m_lower.replace("-", " ").split())
-                        
-                        if len(m_lower) <= 2:
-                            if m_lower in vehicle_model_words:
-                                matched = True
-                                break
-                        else:
-                            if m_lower in vehicle_model_lower or any(word.startswith(m_lower) or m_lower in word for word in vehicle_model_words):
-                                matched = True
-                                break
-                    
-                    if not matched:
-                        logger.info(f"[FILTER] ❌ {vehicle_id_str} - model '{vehicle.get('model')}' does not match any of {model_filter}")
-                        continue
-                else:
-                    m_lower = model_filter.lower()
-                    m_words = set(m_lower.replace("-", " ").split())
-                    
-                    if len(m_lower) <= 2:
-                        if m_lower not in vehicle_model_words:
-                            logger.info(f"[FILTER] ❌ {vehicle_id_str} - model '{vehicle.get('model')}' does not match '{model_filter}'")
-                            continue
-                    else:
-                        if m_lower not in vehicle_model_lower and not any(word.startswith(m_lower) or m_lower in word for word in vehicle_model_words):
-                            logger.info(f"[FILTER] ❌ {vehicle_id_str} - model '{vehicle.get('model')}' does not match '{model_filter}'")
-                            continue
-                
-                logger.info(f"[FILTER] ✓ {vehicle_id_str} - model filter passed")
-            
-            if filters.get("version") and filters["version"].lower() not in vehicle.get("version", "").lower():
-                logger.info(f"[FILTER] ❌ {vehicle_id_str} - version '{vehicle.get('version')}' does not contain '{filters['version']}'")
-                continue
-            
-            price = vehicle.get("pricing", {}).get("price", 0)
-            if isinstance(price, str):
-                try:
-                    price = float(price)
-                except (ValueError, TypeError):
-                    price = 0
-            
-            if filters.get("max_price") and price > filters["max_price"]:
-                continue
-            if filters.get("min_price") and price < filters["min_price"]:
-                continue
-            
-            year = vehicle.get("registrationYear", 0)
-            if isinstance(year, str):
-                try:
-                    year = int(year)
-                except (ValueError, TypeError):
-                    year = 0
-            
-            if filters.get("year_min") and year < filters["year_min"]:
-                continue
-            if filters.get("year_max") and year > filters["year_max"]:
-                continue
-            
-            if filters.get("fuel") and vehicle.get("fuel", "").upper() != filters["fuel"].upper():
-                continue
-            
-            if filters.get("transmission"):
-                normalized_filter = normalize_transmission(filters["transmission"])
-                vehicle_trans = vehicle.get("transmission", "").upper()
-                if vehicle_trans != normalized_filter:
-                    continue
-            
-            if filters.get("body_style"):
-                requested_style = filters["body_style"].upper()
-                vehicle_style = vehicle.get("bodyStyle", "").upper()
-                
-                family_car_styles = ["MONOVOLUMEN", "FAMILIAR", "CUATRO_POR_CUATRO_SUV", "SUV5P", "4X4"]
-                
-                if requested_style in family_car_styles:
-                    if vehicle_style not in family_car_styles:
-                        logger.debug(f"[FILTER] Rejected: {vehicle.get('make')} {vehicle.get('model')} - body_style '{vehicle.get('bodyStyle')}' not in family car styles")
-                        continue
-                else:
-                    if vehicle_style != requested_style:
-                        logger.debug(f"[FILTER] Rejected: {vehicle.get('make')} {vehicle.get('model')} - body_style '{vehicle.get('bodyStyle')}' != '{filters['body_style']}'")
-                        continue
-            
-            if filters.get("color") and filters["color"].lower() not in vehicle.get("color", "").lower():
-                continue
-            
-            kilometers = vehicle.get("kilometers", 0)
-            if isinstance(kilometers, str):
-                try:
-                    kilometers = float(kilometers)
-                except (ValueError, TypeError):
-                    kilometers = 0
-            
-            if filters.get("min_kilometers") and kilometers < filters["min_kilometers"]:
-                continue
-            if filters.get("max_kilometers") and kilometers > filters["max_kilometers"]:
-                continue
-            
-            vehicle_seats = vehicle.get("seats", 0)
-            if isinstance(vehicle_seats, str):
-                try:
-                    vehicle_seats = int(vehicle_seats)
-                except (ValueError, TypeError):
-                    vehicle_seats = 0
-            
-            if filters.get("min_seats") and vehicle_seats < filters["min_seats"]:
-                logger.debug(f"[FILTER] Rejected: {vehicle.get('make')} {vehicle.get('model')} - seats {vehicle_seats} < {filters['min_seats']}")
-                continue
-            if filters.get("max_seats") and vehicle_seats > filters["max_seats"]:
-                continue
-            
-            vehicle_doors = vehicle.get("doors", 0)
-            if isinstance(vehicle_doors, str):
-                try:
-                    vehicle_doors = int(vehicle_doors)
-                except (ValueError, TypeError):
-                    vehicle_doors = 0
-            
-            if filters.get("min_doors") and vehicle_doors < filters["min_doors"]:
-                continue
-            if filters.get("max_doors") and vehicle_doors > filters["max_doors"]:
-                continue
-            
-            vehicle_power = vehicle.get("power", 0)
-            if isinstance(vehicle_power, str):
-                try:
-                    vehicle_power = int(vehicle_power)
-                except (ValueError, TypeError):
-                    vehicle_power = 0
-            
-            if filters.get("min_power") and vehicle_power < filters["min_power"]:
-                logger.debug(f"[FILTER] Rejected: {vehicle.get('make')} {vehicle.get('model')} - power {vehicle_power} CV < {filters['min_power']} CV")
-                continue
-            if filters.get("max_power") and vehicle_power > filters["max_power"]:
-                continue
-            
-            vehicle_cc = vehicle.get("cc", 0)
-            if isinstance(vehicle_cc, str):
-                try:
-                    vehicle_cc = int(vehicle_cc)
-                except (ValueError, TypeError):
-                    vehicle_cc = 0
-            
-            if filters.get("min_cc") and vehicle_cc < filters["min_cc"]:
-                continue
-            if filters.get("max_cc") and vehicle_cc > filters["max_cc"]:
-                continue
-            
-            if filters.get("ecological_label"):
-                vehicle_label = vehicle.get("ecologicalLabel", "")
-                if vehicle_label:
-                    normalized_filter = normalize_ecological_label(filters["ecological_label"])
-                    normalized_vehicle = normalize_ecological_label(vehicle_label)
-                    if normalized_vehicle != normalized_filter:
-                        logger.debug(f"[FILTER] ❌ {vehicle_id_str} - ecological_label '{vehicle_label}' (normalized: '{normalized_vehicle}') != '{filters['ecological_label']}' (normalized: '{normalized_filter}')")
-                        continue
-                else:
-                    logger.debug(f"[FILTER] ❌ {vehicle_id_str} - missing ecological_label, filter requires '{filters['ecological_label']}'")
-                    continue
-            
-            logger.info(f"[FILTER] ✅ {vehicle_id_str} - PASSED ALL FILTERS")
-            filtered.append(vehicle)
-        except Exception as e:
-            logger.error(f"[FILTER] Error filtering vehicle {vehicle.get('make')} {vehicle.get('model')}: {str(e)}")
-            continue
+    plan_summary = f" | plan: {plan.summary()}" if plan is not None else ""
+    if trace:
+        # The per-filter histogram re-scans every column, so it is only built for traced searches.
+        diagnostics = FilterDiagnostics(columns, filters)
+        logger.info(f"[FILTER] {diagnostics.summary()}{plan_summary}")
+        for row, vehicle in enumerate(vehicles):
+            failed = diagnostics.failed_filters(row)
+            logger.info(f"[FILTER TRACE] {_trace_label(vehicle)}: {'rejected by ' + ', '.join(failed) if failed else 'passed'}")
+    else:
+        logger.info(f"[FILTER] {len(rows)}/{len(columns)} passed{plan_summary}")
     
-    logger.info(f"[FILTER] Results: {len(filtered)} vehicles passed all filters out of {len(vehicles)} total")
-    return filtered
+    return rows
+
+def filter_vehicles(vehicles: list, filters: Dict[str, Any], index: Optional[FilterIndex] = None, trace: bool = False) -> list:
+    return [vehicles[row] for row in filter_vehicle_rows(vehicles, filters, index, trace)]
 
 def format_vehicle_response(vehicle: Dict[str, Any]) -> Dict[str, Any]:
     pricing = vehicle.get("pricing", {})
@@ -581,54 +404,244 @@ def format_vehicle_response(vehicle: Dict[str, Any]) -> Dict[str, Any]:
         "store": vehicle.get("store")
     }
 
-def execute_tool(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+def format_car_viewer(car: Dict[str, Any]) -> Dict[str, Any]:
+    car_images = car.get('images', [])
+    main_image = car_images[0] if car_images else 'https://via.placeholder.com/400x300?text=No+Image'
+    car_specs = car.get('specs', {})
+    power = car_specs.get('power', '')
+    hp_value = f"{power} HP" if power else ''
+    return {
+        'brand': car.get('make', ''), 'model': car.get('model', ''),
+        'year': car.get('year', ''), 'image': main_image, 'context': 'default',
+        'specs': {
+            'price': f"€{car.get('price', 0):,.0f}", 'year': str(car.get('year', '')),
+            'mileage': f"{car.get('kilometers', 0):,} km",
+            'doors': f"{car_specs.get('doors', '')} puertas" if car_specs.get('doors') else '',
+            'trunk_space': car_specs.get('trunk_space', ''),
+            'safety_rating': car_specs.get('safety_rating', ''),
+            'fuel_consumption': car_specs.get('fuel', ''),
+            'co2_emissions': car_specs.get('co2_emissions', ''),
+            'range': car_specs.get('range', ''), 'hp': hp_value,
+            '0_100_kmh': car_specs.get('0_100_kmh', ''),
+            'top_speed': car_specs.get('top_speed', ''),
+            'transmission': car_specs.get('transmission', ''),
+            'body_style': car_specs.get('body_style', ''),
+            'color': car_specs.get('color', '')
+        }
+    }
+
+inventory_cache = InventoryCache(
+    fetch_fn=fetch_dealcar_inventory,
+    formatter=format_vehicle_response,
+    viewer_formatter=format_car_viewer,
+    ttl_seconds=settings.inventory_cache_ttl_seconds,
+    refresh_interval_seconds=settings.inventory_refresh_interval_seconds,
+    snapshot_path=settings.inventory_snapshot_file,
+    stale_while_revalidate_seconds=settings.inventory_stale_while_revalidate_seconds,
+    failure_backoff_seconds=settings.inventory_failure_backoff_seconds,
+    key=DEALER_ID
+)
+
+search_cache = ResultCache(
+    max_entries=settings.search_cache_size,
+    ttl_seconds=settings.search_cache_ttl_seconds
+)
+inventory_cache.subscribe(lambda snapshot, change_set: search_cache.clear())
+
+search_cursors = CursorStore(
+    ttl_seconds=settings.search_cursor_ttl_seconds,
+    max_sets_per_session=settings.search_cursor_max_sets,
+    max_rows=settings.search_cursor_max_rows
+)
+PAGE_SIZE = 7
+
+def get_inventory_snapshot() -> InventorySnapshot:
+    return inventory_cache.get_snapshot()
+
+def formatted_vehicle(vehicle: Dict[str, Any]) -> Dict[str, Any]:
+    snapshot = inventory_cache.peek()
+    return snapshot.formatted(vehicle) if snapshot is not None else format_vehicle_response(vehicle)
+
+def car_viewer_data(car: Dict[str, Any]) -> Dict[str, Any]:
+    snapshot = inventory_cache.peek()
+    return snapshot.viewer(car) if snapshot is not None else format_car_viewer(car)
+
+def search_inventory(snapshot: InventorySnapshot, arguments: Dict[str, Any], trace: bool = False) -> Dict[str, Any]:
+    vehicles = snapshot.vehicles
+    logger.info(f"[TOOL EXECUTION] Total vehicles in snapshot v{snapshot.version}: {len(vehicles)}")
+    
+    rows = filter_vehicle_rows(vehicles, arguments, snapshot.filter_index, trace)
+    filtered_vehicles = [vehicles[row] for row in rows]
+    logger.info(f"[TOOL EXECUTION] Filtered vehicles: {len(filtered_vehicles)}")
+    
+    display_ids = arguments.get("display_ids")
+    sort_by = arguments.get("sort_by")
+    if display_ids and isinstance(display_ids, list):
+        logger.info(f"[TOOL EXECUTION] display_ids provided: {display_ids}")
+        
+        filtered_positions = {}
+        for position, vehicle in enumerate(filtered_vehicles):
+            filtered_positions.setdefault(vehicle.get("vehicleId", ""), position)
+        
+        displayed_vehicles = []
+        displayed_positions = set()
+        for display_id in display_ids:
+            candidates = [
+                filtered_positions[vehicle_id]
+                for vehicle_id in snapshot.index.prefix_ids(display_id)
+                if vehicle_id in filtered_positions and filtered_positions[vehicle_id] not in displayed_positions
+            ]
+            
+            if candidates:
+                position = min(candidates)
+                vehicle = filtered_vehicles[position]
+                displayed_positions.add(position)
+                displayed_vehicles.append(vehicle)
+                logger.info(f"[TOOL EXECUTION] ✓ Including vehicle: {vehicle.get('make')} {vehicle.get('model')} (ID: {vehicle.get('vehicleId')})")
+            else:
+                logger.warning(f"[TOOL EXECUTION] ⚠ Vehicle ID not found in filtered results: {display_id}")
+        
+        filtered_vehicles = displayed_vehicles
+        logger.info(f"[TOOL EXECUTION] After display_ids filtering: {len(filtered_vehicles)} cars")
+    elif sort_by in SORT_OPTIONS:
+        descending = {"asc": False, "desc": True}.get(arguments.get("sort_order"))
+        filtered_vehicles = [vehicles[row] for row in top_rows(snapshot.columns, rows, sort_by, PAGE_SIZE, descending)]
+        logger.info(f"[TOOL EXECUTION] No display_ids provided, showing top 7 results by {sort_by}")
+    else:
+        filtered_vehicles = filtered_vehicles[:PAGE_SIZE]
+        logger.info(f"[TOOL EXECUTION] No display_ids provided, showing first 7 results")
+    
+    result = {
+        "total_available": snapshot.total_elements,
+        "total_matches": len(rows),
+        "results_count": len(filtered_vehicles),
+        "cars": [snapshot.formatted(v) for v in filtered_vehicles]
+    }
+    if sort_by in SORT_OPTIONS and not display_ids:
+        result["sorted_by"] = sort_by
+    if arguments.get("include_facets"):
+        result["facets"] = facet_counts(snapshot.columns, rows)
+    if not rows and not display_ids:
+        result["near_misses"] = near_misses(snapshot, arguments)
+    logger.info(f"[TOOL EXECUTION] Returning {len(result['cars'])} cars to OpenAI")
+    return result
+
+def near_misses(snapshot: InventorySnapshot, arguments: Dict[str, Any]) -> List[Dict[str, Any]]:
+    started = time.perf_counter()
+    sort_by = arguments.get("sort_by")
+    descending = {"asc": False, "desc": True}.get(arguments.get("sort_order"))
+    misses = []
+    for relaxed, relaxed_steps, rows in RelaxationSearch(snapshot.columns, arguments).near_misses():
+        rows = rows.tolist()
+        shown = top_rows(snapshot.columns, rows, sort_by, NEAR_MISS_CARS, descending) if sort_by in SORT_OPTIONS else rows[:NEAR_MISS_CARS]
+        misses.append({
+            "relaxed": relaxed_steps,
+            "arguments": {key: value for key, value in relaxed.items() if key not in ("cursor", "include_facets")},
+            "total_matches": len(rows),
+            "cars": [snapshot.formatted(snapshot.vehicles[row]) for row in shown]
+        })
+    logger.info(f"[TOOL EXECUTION] No matches; {len(misses)} near misses in {(time.perf_counter() - started) * 1000:.2f}ms: {[miss['relaxed'] for miss in misses]}")
+    return misses
+
+def search_next_page(snapshot: InventorySnapshot, session_id: str, cursor: str) -> Dict[str, Any]:
+    resolved = search_cursors.resolve(session_id, cursor)
+    if resolved is None:
+        logger.warning(f"[TOOL EXECUTION] Unknown or expired cursor: {cursor}")
+        return {"error": "This cursor has expired. Run the search again with the same filters."}
+    
+    result_set, offset = resolved
+    rows = result_set.rows
+    if rows is None or result_set.version != snapshot.version:
+        arguments = result_set.arguments
+        rows = filter_vehicle_rows(snapshot.vehicles, arguments, snapshot.filter_index)
+        if arguments.get("sort_by") in SORT_OPTIONS:
+            descending = {"asc": False, "desc": True}.get(arguments.get("sort_order"))
+            rows = ranked_rows(snapshot.columns, rows, arguments["sort_by"], descending)
+        search_cursors.store_rows(result_set, rows, snapshot.version)
+    
+    page_rows = rows[offset:offset + PAGE_SIZE]
+    logger.info(f"[TOOL EXECUTION] Cursor {cursor}: cars {offset + 1}-{offset + len(page_rows)} of {len(rows)}")
+    result = {
+        "total_available": snapshot.total_elements,
+        "total_matches": len(rows),
+        "results_count": len(page_rows),
+        "cars": [snapshot.formatted(snapshot.vehicles[row]) for row in page_rows]
+    }
+    if offset + PAGE_SIZE < len(rows):
+        result["next_cursor"] = page_cursor(result_set.set_id, offset + PAGE_SIZE)
+    return result
+
+def explain_inventory_search(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        snapshot = get_inventory_snapshot()
+    except InventoryFetchError as e:
+        return {"error": str(e)}
+    arguments, corrections = snapshot.names.resolve_filters(arguments)
+    explanation = compile_filters(snapshot.filter_index, arguments).explain()
+    explanation["snapshot_version"] = snapshot.version
+    if corrections:
+        explanation["resolved"] = corrections
+    return explanation
+
+def execute_tool(tool_name: str, arguments: Dict[str, Any], debug: bool = False, session_id: Optional[str] = None) -> Dict[str, Any]:
     logger.info(f"[TOOL EXECUTION] Tool: {tool_name}")
     logger.info(f"[TOOL EXECUTION] Arguments: {json.dumps(arguments, indent=2)}")
     
     if tool_name == "get_car_inventory":
-        api_response = fetch_dealcar_inventory()
-        
-        if "error" in api_response:
-            logger.error(f"[TOOL EXECUTION] API Error detected: {api_response['error']}")
-            return api_response
-        
-        vehicles = api_response.get("vehicles", [])
-        logger.info(f"[TOOL EXECUTION] Total vehicles from API: {len(vehicles)}")
+        try:
+            snapshot = get_inventory_snapshot()
+        except InventoryFetchError as e:
+            logger.error(f"[TOOL EXECUTION] API Error detected: {str(e)}")
+            return {"error": str(e)}
         
-        filtered_vehicles = filter_vehicles(vehicles, arguments)
-        logger.info(f"[TOOL EXECUTION] Filtered vehicles: {len(filtered_vehicles)}")
+        session_key = session_id or "default"
+        if arguments.get("cursor"):
+            return search_next_page(snapshot, session_key, str(arguments["cursor"]))
         
-        display_ids = arguments.get("display_ids")
-        if display_ids and isinstance(display_ids, list):
-            logger.info(f"[TOOL EXECUTION] display_ids provided: {display_ids}")
-            
-            displayed_vehicles = []
-            for display_id in display_ids:
-                matched = False
-                for vehicle in filtered_vehicles:
-                    vehicle_id = vehicle.get("vehicleId", "")
-                    if vehicle_id == display_id or vehicle_id.startswith(display_id):
-                        if vehicle not in displayed_vehicles:
-                            displayed_vehicles.append(vehicle)
-                            logger.info(f"[TOOL EXECUTION] ✓ Including vehicle: {vehicle.get('make')} {vehicle.get('model')} (ID: {vehicle_id})")
-                            matched = True
-                            break
-                
-                if not matched:
-                    logger.warning(f"[TOOL EXECUTION] ⚠ Vehicle ID not found in filtered results: {display_id}")
-            
-            filtered_vehicles = displayed_vehicles
-            logger.info(f"[TOOL EXECUTION] After display_ids filtering: {len(filtered_vehicles)} cars")
+        arguments, corrections = snapshot.names.resolve_filters(arguments)
+        if debug:
+            result = search_inventory(snapshot, arguments, trace=True)
         else:
-            filtered_vehicles = filtered_vehicles[:7]
-            logger.info(f"[TOOL EXECUTION] No display_ids provided, showing first 7 results")
+            cache_key = (snapshot.version, canonical_filters(arguments))
+            result = search_cache.get(cache_key)
+            if result is not None:
+                logger.info(f"[TOOL EXECUTION] Search cache hit for snapshot v{snapshot.version}: {result['results_count']} cars")
+            else:
+                started = time.perf_counter()
+                result = search_inventory(snapshot, arguments)
+                search_cache.put(cache_key, result, time.perf_counter() - started)
         
-        result = {
-            "total_available": api_response.get("totalElements", 0),
-            "results_count": len(filtered_vehicles),
-            "cars": [format_vehicle_response(v) for v in filtered_vehicles]
-        }
-        logger.info(f"[TOOL EXECUTION] Returning {len(result['cars'])} cars to OpenAI")
+        result = dict(result)
+        if not arguments.get("display_ids") and result["total_matches"] > result["results_count"]:
+            set_id = search_cursors.open(session_key, dict(arguments), snapshot.version)
+            result["next_cursor"] = page_cursor(set_id, PAGE_SIZE)
+        if corrections:
+            result["resolved"] = corrections
+        return result
+    
+    elif tool_name == "get_inventory_facets":
+        try:
+            snapshot = get_inventory_snapshot()
+        except InventoryFetchError as e:
+            logger.error(f"[TOOL EXECUTION] API Error detected: {str(e)}")
+            return {"error": str(e)}
+        
+        arguments, corrections = snapshot.names.resolve_filters(arguments)
+        cache_key = (snapshot.version, canonical_filters(arguments), "facets")
+        result = search_cache.get(cache_key)
+        if result is None:
+            started = time.perf_counter()
+            rows = filter_vehicle_rows(snapshot.vehicles, arguments, snapshot.filter_index, debug)
+            result = {
+                "total_available": snapshot.total_elements,
+                "total_matches": len(rows),
+                "facets": facet_counts(snapshot.columns, rows)
+            }
+            search_cache.put(cache_key, result, time.perf_counter() - started)
+        logger.info(f"[TOOL EXECUTION] Facets over {result['total_matches']} matching cars")
+        result = dict(result)
+        if corrections:
+            result["resolved"] = corrections
         return result
     
     elif tool_name == "book_test_drive":